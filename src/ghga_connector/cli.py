@@ -37,7 +37,7 @@ from ghga_connector.core import (
     async_client,
     exceptions,
 )
-from ghga_connector.core.api_calls import WKVSCaller
+from ghga_connector.core.api_calls import WKVSCaller, is_service_healthy
 from ghga_connector.core.downloading.batch_processing import FileStager
 from ghga_connector.core.main import (
     decrypt_file,
@@ -226,6 +226,7 @@ async def async_upload(
             my_public_key_path=my_public_key_path,
             my_private_key_path=my_private_key_path,
             part_size=CONFIG.part_size,
+            max_concurrent_uploads=CONFIG.max_concurrent_uploads,
         )
 
 
@@ -306,6 +307,11 @@ async def async_download(
             work_package_information=work_package_information,
         )
 
+        # check the download API once for the whole batch instead of once per file,
+        # the check is synchronous, so run it off the event loop
+        if not await asyncio.to_thread(is_service_healthy, parameters.dcs_api_url):
+            raise exceptions.ApiNotReachableError(api_url=parameters.dcs_api_url)
+
         message_display.display("Preparing files for download...")
         stager = FileStager(
             wanted_file_ids=list(parameters.file_ids_with_extension),
@@ -316,9 +322,9 @@ async def async_download(
             client=client,
             config=CONFIG,
         )
-        while not stager.finished:
-            staged_files = await stager.get_staged_files()
-            for file_id in staged_files:
+        staged_file_ids = stager.iter_staged_files()
+        try:
+            async for file_id in staged_file_ids:
                 message_display.display(f"Downloading file with id '{file_id}'...")
                 await download_file(
                     api_url=parameters.dcs_api_url,
@@ -333,7 +339,9 @@ async def async_download(
                     work_package_accessor=parameters.work_package_accessor,
                     overwrite=overwrite,
                 )
-            staged_files.clear()
+        finally:
+            # stop polling for staged files if a download failed
+            await staged_file_ids.aclose()
 
 
 @cli.command(no_args_is_help=True)
@@ -30,6 +30,9 @@ class Config(BaseSettings):
     max_concurrent_downloads: PositiveInt = Field(
         default=5, description="Number of parallel downloader tasks for file parts."
     )
+    max_concurrent_uploads: PositiveInt = Field(
+        default=5, description="Number of parallel uploader tasks for file parts."
+    )
     max_retries: NonNegativeInt = Field(
         default=MAX_RETRIES, description="Number of times to retry failed API calls."
     )
@@ -21,9 +21,13 @@ It should not contain any service API-related code.
 from .client import async_client, httpx_client, retry_handler  # noqa: F401
 from .file_operations import (  # noqa: F401
     calc_part_ranges,
-    get_segments,
     is_file_encrypted,
+    open_for_positional_writes,
+    preallocate,
     read_file_parts,
+    read_file_parts_ahead,
+    read_file_parts_direct,
+    write_at,
 )
 from .http_translation import ResponseExceptionTranslator  # noqa: F401
 from .message_display import AbstractMessageDisplay, MessageColors  # noqa: F401
@@ -26,7 +26,7 @@ from tenacity import (
     retry_if_exception_type,
     retry_if_result,
     stop_after_attempt,
-    wait_exponential_jitter,
+    wait_random_exponential,
 )
 
 from ghga_connector.config import CONFIG
@@ -39,6 +39,7 @@ class HttpxClientConfigurator:
     @cached_property
     def retry_handler(self):
         """Configure client retry handler with exponential backoff"""
+        retry_status_codes = frozenset(CONFIG.retry_status_codes)
         return AsyncRetrying(
             reraise=True,
             retry=(
@@ -50,16 +51,22 @@ class HttpxClientConfigurator:
                     )
                 )
                 | retry_if_result(
-                    lambda response: response.status_code in CONFIG.retry_status_codes
+                    lambda response: response.status_code in retry_status_codes
                 )
             ),
             stop=stop_after_attempt(CONFIG.max_retries),
-            wait=wait_exponential_jitter(max=CONFIG.exponential_backoff_max),
+            # full jitter spreads out the retries of concurrent part transfers
+            wait=wait_random_exponential(max=CONFIG.exponential_backoff_max),
         )
 
 
 retry_handler = HttpxClientConfigurator().retry_handler
 
+# file parts are either downloaded or uploaded concurrently, so size the pool for both
+MAX_CONCURRENT_TRANSFERS = max(
+    CONFIG.max_concurrent_downloads, CONFIG.max_concurrent_uploads
+)
+
 
 @contextmanager
 def httpx_client():
@@ -82,8 +89,16 @@ def get_cache_transport(
     The `wrapped_transport` parameter can be used for testing to inject, for example,
     an httpx.ASGITransport pointing to a FastAPI app.
     """
+    # The client's connection limits do not apply to mounted transports.
+    # Leave room for staging checks or presigning alongside the part transfers.
     cache_transport = hishel.AsyncCacheTransport(
-        transport=wrapped_transport or httpx.AsyncHTTPTransport(),
+        transport=wrapped_transport
+        or httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=2 * MAX_CONCURRENT_TRANSFERS,
+                max_keepalive_connections=MAX_CONCURRENT_TRANSFERS,
+            )
+        ),
         storage=hishel.AsyncInMemoryStorage(ttl=1800),  # persist for 30 minutes
         controller=hishel.Controller(
             cacheable_methods=["POST", "GET"],
@@ -106,8 +121,8 @@ async def async_client():
     async with httpx.AsyncClient(
         timeout=TIMEOUT,
         limits=httpx.Limits(
-            max_connections=CONFIG.max_concurrent_downloads,
-            max_keepalive_connections=CONFIG.max_concurrent_downloads,
+            max_connections=MAX_CONCURRENT_TRANSFERS,
+            max_keepalive_connections=MAX_CONCURRENT_TRANSFERS,
         ),
         mounts=get_mounts(),
     ) as client:
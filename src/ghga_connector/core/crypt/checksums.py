@@ -16,6 +16,10 @@
 """Wrapper functionality for checksum generation"""
 
 import hashlib
+from typing import Union
+
+# size of the blocks fed to both hashers in turn, small enough to stay in the cache
+HASH_BLOCK_SIZE = 256 * 1024
 
 
 class Checksums:
@@ -34,10 +38,6 @@ class Checksums:
             + f"Encrypted SHA256: {self._encrypted_sha256}"
         )
 
-    def encrypted_is_empty(self):
-        """Returns true if the encryption checksum buffer is still empty"""
-        return len(self._encrypted_md5) > 0
-
     def get(self):
         """Return all checksums at the end of processing"""
         return (
@@ -46,11 +46,23 @@ class Checksums:
             self._encrypted_sha256,
         )
 
-    def update_unencrypted(self, part: bytes):
+    def update_unencrypted(self, part: Union[bytes, memoryview]):
         """Update checksum for unencrypted file"""
         self._unencrypted_sha256.update(part)
 
-    def update_encrypted(self, part: bytes):
-        """Update encrypted part checksums"""
-        self._encrypted_md5.append(hashlib.md5(part, usedforsecurity=False).hexdigest())
-        self._encrypted_sha256.append(hashlib.sha256(part).hexdigest())
+    def update_encrypted(self, part: Union[bytes, memoryview]):
+        """Update encrypted part checksums.
+
+        Pass a memoryview to hash a slice of a part without copying it.
+        Both checksums are computed in a single pass over the part, so that every
+        block is still cached when the second hasher gets to it.
+        """
+        md5 = hashlib.md5(usedforsecurity=False)
+        sha256 = hashlib.sha256()
+        with memoryview(part) as view:
+            for start in range(0, len(view), HASH_BLOCK_SIZE):
+                block = view[start : start + HASH_BLOCK_SIZE]
+                md5.update(block)
+                sha256.update(block)
+        self._encrypted_md5.append(md5.hexdigest())
+        self._encrypted_sha256.append(sha256.hexdigest())
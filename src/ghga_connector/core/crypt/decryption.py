@@ -15,24 +15,74 @@
 #
 """This module contains Crypt4GH based decryption functionality"""
 
+from functools import lru_cache
+from io import BufferedReader, BufferedWriter
 from pathlib import Path
 
+import crypt4gh.header
 import crypt4gh.keys
 import crypt4gh.lib
+from nacl.bindings import crypto_aead_chacha20poly1305_ietf_decrypt
+from nacl.exceptions import CryptoError
 
 from .abstract_bases import Decryptor
+from .encryption import NONCE_SIZE
+
+# number of encrypted segments that are read from the file at once
+DECRYPTION_BATCH_SEGMENTS = 64
+
+
+@lru_cache(maxsize=4)
+def _load_private_key(key_path: Path) -> bytes:
+    """Load the private key from the given path, only once for multiple files.
+
+    Loading an encrypted key involves a deliberately slow key derivation.
+    """
+    return crypt4gh.keys.get_private_key(key_path, callback=None)
 
 
 class Crypt4GHDecryptor(Decryptor):
     """Convenience class to deal with Crypt4GH decryption"""
 
     def __init__(self, decryption_key_path: Path):
-        self._decryption_key = crypt4gh.keys.get_private_key(
-            decryption_key_path, callback=None
-        )
+        self._decryption_key = _load_private_key(decryption_key_path)
 
     def decrypt_file(self, *, input_path: Path, output_path: Path):
         """Decrypt provided file using Crypt4GH lib"""
         keys = [(0, self._decryption_key, None)]
         with input_path.open("rb") as infile, output_path.open("wb") as outfile:
-            crypt4gh.lib.decrypt(keys=keys, infile=infile, outfile=outfile)
+            session_keys, edit_list = crypt4gh.header.deconstruct(infile, keys)
+            if edit_list is not None or len(session_keys) != 1:
+                # leave the less common cases to the library, starting over
+                infile.seek(0)
+                crypt4gh.lib.decrypt(keys=keys, infile=infile, outfile=outfile)
+                return
+            _decrypt_segments(
+                infile=infile, outfile=outfile, session_key=session_keys[0]
+            )
+
+
+def _decrypt_segments(
+    *, infile: BufferedReader, outfile: BufferedWriter, session_key: bytes
+):
+    """Decrypt the segments following the header with the given session key.
+
+    Unlike `crypt4gh.lib.decrypt`, this reads many segments at once and does not
+    need to try out multiple keys or apply an edit list.
+    A ValueError is raised if a segment cannot be decrypted.
+    """
+    segment_size = crypt4gh.lib.CIPHER_SEGMENT_SIZE
+    while ciphertext := infile.read(DECRYPTION_BATCH_SEGMENTS * segment_size):
+        plaintext = []
+        for start in range(0, len(ciphertext), segment_size):
+            nonce = ciphertext[start : start + NONCE_SIZE]
+            segment = ciphertext[start + NONCE_SIZE : start + segment_size]
+            try:
+                plaintext.append(
+                    crypto_aead_chacha20poly1305_ietf_decrypt(
+                        segment, None, nonce, session_key
+                    )  # no aad
+                )
+            except CryptoError as error:
+                raise ValueError("Could not decrypt that block") from error
+        outfile.write(b"".join(plaintext))
@@ -16,22 +16,30 @@
 """This module contains Crypt4GH based encryption functionality"""
 
 import base64
+import math
 import os
+from collections import deque
 from collections.abc import Generator
+from concurrent.futures import Executor, ThreadPoolExecutor
 from io import BufferedReader
 from pathlib import Path
-from typing import Union
+from typing import Optional, Union
 
 import crypt4gh.header
 import crypt4gh.keys
 import crypt4gh.lib
 from nacl.bindings import crypto_aead_chacha20poly1305_ietf_encrypt
 
-from ghga_connector.core import get_segments, read_file_parts
+from ghga_connector.core import read_file_parts_ahead
 
 from .abstract_bases import Encryptor
 from .checksums import Checksums
 
+# size of the nonce preceding each encrypted segment
+NONCE_SIZE = 12
+# number of threads encrypting the segments of a part in parallel
+ENCRYPTION_THREADS = os.cpu_count() or 1
+
 
 class Crypt4GHEncryptor(Encryptor):
     """Handles on the fly encryption and checksum calculation"""
@@ -41,11 +49,12 @@ class Crypt4GHEncryptor(Encryptor):
         part_size: int,
         private_key_path: Path,
         server_public_key: str,
-        checksums: Checksums = Checksums(),
+        checksums: Union[Checksums, None] = None,
         file_secret: Union[bytes, None] = None,
     ):
         self._encrypted_file_size = 0
-        self._checksums = checksums
+        # don't share a default instance, checksums must not add up across files
+        self._checksums = Checksums() if checksums is None else checksums
         self._part_size = part_size
         self._private_key_path = private_key_path
         self._server_public_key = base64.b64decode(server_public_key)
@@ -53,19 +62,73 @@ class Crypt4GHEncryptor(Encryptor):
             file_secret = os.urandom(32)
         self._file_secret = file_secret
 
-    def _encrypt(self, part: bytes):
-        """Encrypt file part using secret"""
-        segments, incomplete_segment = get_segments(
-            part=part, segment_size=crypt4gh.lib.SEGMENT_SIZE
+    def _encrypt(
+        self, part: bytes, executor: Optional[Executor] = None
+    ) -> tuple[list[bytes], bytes]:
+        """Encrypt the full segments of a file part using secret.
+
+        The unencrypted checksum is updated with the segments as they are split off.
+        The nonces and encrypted segments are returned as separate chunks, in the
+        order they are stored, so that they can be joined without an intermediate
+        buffer. The remaining incomplete segment is returned as well. If an executor
+        is given, batches of consecutive segments are encrypted in parallel, which is
+        effective since the encryption releases the GIL.
+        """
+        # hash each plaintext segment right after slicing it, while it is still in
+        # the cache, instead of in a separate pass over the whole part
+        update_unencrypted = self._checksums.update_unencrypted
+        segment_size = crypt4gh.lib.SEGMENT_SIZE
+        full_size = len(part) - len(part) % segment_size
+        segments = []
+        for start in range(0, full_size, segment_size):
+            segment = part[start : start + segment_size]
+            update_unencrypted(segment)
+            segments.append(segment)
+        incomplete_segment = part[full_size:]
+
+        # draw the nonces for all segments at once instead of one by one
+        nonces = os.urandom(NONCE_SIZE * len(segments))
+        if executor is None or len(segments) < 2:
+            return self._encrypt_segments(segments, nonces), incomplete_segment
+
+        batch_size = math.ceil(len(segments) / ENCRYPTION_THREADS)
+        encrypted_batches = executor.map(
+            self._encrypt_segments,
+            [
+                segments[start : start + batch_size]
+                for start in range(0, len(segments), batch_size)
+            ],
+            [
+                nonces[start * NONCE_SIZE : (start + batch_size) * NONCE_SIZE]
+                for start in range(0, len(segments), batch_size)
+            ],
         )
+        chunks: list[bytes] = []
+        for encrypted_batch in encrypted_batches:
+            chunks += encrypted_batch
+        return chunks, incomplete_segment
 
-        encrypted_segments = [self._encrypt_segment(segment) for segment in segments]
+    def _encrypt_segments(self, segments: list[bytes], nonces: bytes) -> list[bytes]:
+        """Encrypt the given full segments.
 
-        return b"".join(encrypted_segments), incomplete_segment
+        Each segment is encrypted with its nonce from the given ones. The nonces and
+        encrypted segments are returned alternately, in the order they are stored.
+        """
+        file_secret = self._file_secret
+        chunks = []
+        for index, segment in enumerate(segments):
+            nonce = nonces[index * NONCE_SIZE : (index + 1) * NONCE_SIZE]
+            chunks.append(nonce)
+            chunks.append(
+                crypto_aead_chacha20poly1305_ietf_encrypt(
+                    segment, None, nonce, file_secret
+                )  # no aad
+            )
+        return chunks
 
     def _encrypt_segment(self, segment: bytes):
         """Encrypt one single segment"""
-        nonce = os.urandom(12)
+        nonce = os.urandom(NONCE_SIZE)
         encrypted_data = crypto_aead_chacha20poly1305_ietf_encrypt(
             segment, None, nonce, self._file_secret
         )  # no aad
@@ -92,47 +155,80 @@ class Crypt4GHEncryptor(Encryptor):
 
     def process_file(self, file: BufferedReader) -> Generator[bytes, None, None]:
         """Encrypt file parts and prepare for upload."""
-        unprocessed_bytes = b""
-        upload_buffer = self._create_envelope()
+        envelope_size = len(envelope := self._create_envelope())
         update_encrypted = self._checksums.update_encrypted
+        encrypted_parts = self._encrypt_file(file=file, envelope=envelope)
 
-        # get envelope size to adjust checksum buffers and encrypted content size
-        envelope_size = len(upload_buffer)
-
-        for file_part in read_file_parts(file=file, part_size=self._part_size):
-            # process unencrypted
-            self._checksums.update_unencrypted(file_part)
-            unprocessed_bytes += file_part
-
-            # encrypt in chunks
-            encrypted_bytes, unprocessed_bytes = self._encrypt(unprocessed_bytes)
-            upload_buffer += encrypted_bytes
-
-            # update checksums and yield if part size
-            if len(upload_buffer) >= self._part_size:
-                current_part = upload_buffer[: self._part_size]
-                if self._checksums.encrypted_is_empty():
-                    update_encrypted(current_part[envelope_size:])
-                else:
-                    update_encrypted(current_part)
-                self._encrypted_file_size += self._part_size
-                yield current_part
-                upload_buffer = upload_buffer[self._part_size :]
-
-        # process dangling bytes
-        if unprocessed_bytes:
-            upload_buffer += self._encrypt_segment(unprocessed_bytes)
+        # the first part starts with the envelope, which is excluded from the
+        # checksums and the encrypted content size
+        first_part = next(encrypted_parts)
+        update_encrypted(memoryview(first_part)[envelope_size:])
+        self._encrypted_file_size += len(first_part) - envelope_size
+        yield first_part
 
-        while len(upload_buffer) >= self._part_size:
-            current_part = upload_buffer[: self._part_size]
+        for current_part in encrypted_parts:
             update_encrypted(current_part)
-            self._encrypted_file_size += self._part_size
+            self._encrypted_file_size += len(current_part)
             yield current_part
-            upload_buffer = upload_buffer[self._part_size :]
 
-        if upload_buffer:
-            update_encrypted(upload_buffer)
-            self._encrypted_file_size += len(upload_buffer)
-            yield upload_buffer
+    def _encrypt_file(
+        self, *, file: BufferedReader, envelope: bytes
+    ) -> Generator[bytes, None, None]:
+        """Encrypt the file and yield the envelope and the encrypted content in parts.
+
+        At least one part is yielded, since the envelope is never empty.
+        """
+        unprocessed_bytes = b""
+        # encrypted chunks are only joined when a full part is available, so every
+        # encrypted byte is copied just once before it is handed to the uploader
+        chunks = deque([envelope])
+        buffered_size = len(envelope)
+
+        # overlap reading the next part with encrypting the current one
+        file_parts = read_file_parts_ahead(file=file, part_size=self._part_size)
+        with ThreadPoolExecutor(max_workers=ENCRYPTION_THREADS) as executor:
+            for file_part in file_parts:
+                unprocessed_bytes += file_part
+
+                # encrypt in chunks
+                encrypted_chunks, unprocessed_bytes = self._encrypt(
+                    unprocessed_bytes, executor=executor
+                )
+                chunks += encrypted_chunks
+                buffered_size += sum(map(len, encrypted_chunks))
+
+                # yield if part size
+                while buffered_size >= self._part_size:
+                    buffered_size -= self._part_size
+                    yield _pop_front(chunks, self._part_size)
 
-        self._encrypted_file_size -= envelope_size
+        # process dangling bytes
+        if unprocessed_bytes:
+            self._checksums.update_unencrypted(unprocessed_bytes)
+            encrypted_segment = self._encrypt_segment(unprocessed_bytes)
+            chunks.append(encrypted_segment)
+            buffered_size += len(encrypted_segment)
+
+        while buffered_size >= self._part_size:
+            buffered_size -= self._part_size
+            yield _pop_front(chunks, self._part_size)
+
+        if chunks:
+            yield b"".join(chunks)
+
+
+def _pop_front(chunks: deque, size: int) -> bytes:
+    """Remove the given number of bytes from the front of the chunks and join them.
+
+    Only a chunk that crosses the boundary is split, everything else is copied
+    once into the returned part.
+    """
+    front = []
+    while size > 0:
+        chunk = chunks.popleft()
+        if len(chunk) > size:
+            chunks.appendleft(chunk[size:])
+            chunk = chunk[:size]
+        front.append(chunk)
+        size -= len(chunk)
+    return b"".join(front)
@@ -16,8 +16,8 @@
 """Contains base class for download functionality"""
 
 from abc import ABC, abstractmethod
+from asyncio import Future
 from collections.abc import Coroutine
-from io import BufferedWriter
 from pathlib import Path
 from typing import Any
 
@@ -51,33 +51,29 @@ class DownloaderBase(ABC):
         """
 
     @abstractmethod
-    async def download_to_queue(self, *, part_range: PartRange) -> None:
+    async def download_part(
+        self,
+        *,
+        part_range: PartRange,
+        fd: int,
+        offset: Future[int],
+        progress_bar: ProgressBar,
+    ) -> None:
         """
-        Start downloading file parts in parallel into a queue.
-        This should be wrapped into asyncio.task and is guarded by a semaphore to limit
-        the amount of ongoing parallel downloads to max_concurrent_downloads.
+        Download a file part and write it to the file with the given descriptor.
+        The parts are downloaded by a fixed pool of max_concurrent_downloads workers,
+        which limits the amount of ongoing parallel downloads.
         """
 
     @abstractmethod
-    async def download_content_range(
+    async def download_content_range(  # noqa: PLR0913
         self,
         *,
         url: str,
         start: int,
         end: int,
-    ) -> None:
-        """Download a specific range of a file's content using a presigned url."""
-
-    @abstractmethod
-    async def drain_queue_to_file(
-        self,
-        *,
-        file: BufferedWriter,
-        file_size: int,
-        offset: int,
+        fd: int,
+        offset: Future[int],
         progress_bar: ProgressBar,
     ) -> None:
-        """Write downloaded file bytes from queue.
-        This should be started as asyncio.Task and awaited after the download_to_queue
-        tasks have been created/started.
-        """
+        """Download a specific range of a file's content using a presigned url."""
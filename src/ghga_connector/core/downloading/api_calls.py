@@ -15,7 +15,8 @@
 
 """This module provides all API calls related to downloading files."""
 
-from typing import Union
+from collections.abc import Callable
+from typing import NoReturn, Union
 
 import httpx
 
@@ -62,7 +63,7 @@ async def get_envelope_authorization(
     a Crypt4GH envelope for file identified by `file_id`
     """
     # build url
-    url = f"{work_package_accessor.dcs_api_url}/objects/{file_id}/envelopes"
+    url = work_package_accessor.dcs_objects_url + file_id + "/envelopes"
     headers = await _get_authorization(
         file_id=file_id, work_package_accessor=work_package_accessor
     )
@@ -77,13 +78,45 @@ async def get_file_authorization(
     object storage URL for file download
     """
     # build URL
-    url = f"{work_package_accessor.dcs_api_url}/objects/{file_id}"
+    url = work_package_accessor.dcs_objects_url + file_id
     headers = await _get_authorization(
         file_id=file_id, work_package_accessor=work_package_accessor
     )
     return UrlAndHeaders(url, headers)
 
 
+def raise_unauthorized_error(*, url: str, response: httpx.Response) -> NoReturn:
+    """Raise an UnauthorizedAPICallError with the cause given in a 403 response"""
+    content = response.json()
+    # handle both normal and httpyexpect 403 response
+    try:
+        cause = content["description"]
+    except KeyError:
+        cause = content["detail"]
+    raise exceptions.UnauthorizedAPICallError(url=url, cause=cause)
+
+
+def _handle_retry_response(*, url: str, response: httpx.Response) -> RetryResponse:
+    """Extract the retry time from a 202 response for a file that is being staged"""
+    headers = response.headers
+    if "retry-after" not in headers:
+        raise exceptions.RetryTimeExpectedError(url=url)
+
+    return RetryResponse(retry_after=int(headers["retry-after"]))
+
+
+def _raise_bad_response_code(*, url: str, response: httpx.Response) -> NoReturn:
+    """Raise a BadResponseCodeError for any status code without a dedicated handler"""
+    raise exceptions.BadResponseCodeError(url=url, response_code=response.status_code)
+
+
+# Handlers for all non-200 status codes expected from the DRS object endpoint
+_DOWNLOAD_URL_HANDLERS: dict[int, Callable[..., RetryResponse]] = {
+    202: _handle_retry_response,
+    403: raise_unauthorized_error,
+}
+
+
 async def get_download_url(
     *,
     client: httpx.AsyncClient,
@@ -110,22 +143,8 @@ async def get_download_url(
 
     status_code = response.status_code
     if status_code != 200:
-        if status_code == 403:
-            content = response.json()
-            # handle both normal and httpyexpect 403 response
-            try:
-                cause = content["description"]
-            except KeyError:
-                cause = content["detail"]
-            raise exceptions.UnauthorizedAPICallError(url=url, cause=cause)
-        if status_code != 202:
-            raise exceptions.BadResponseCodeError(url=url, response_code=status_code)
-
-        headers = response.headers
-        if "retry-after" not in headers:
-            raise exceptions.RetryTimeExpectedError(url=url)
-
-        return RetryResponse(retry_after=int(headers["retry-after"]))
+        handler = _DOWNLOAD_URL_HANDLERS.get(status_code, _raise_bad_response_code)
+        return handler(url=url, response=response)
 
     # look for an access method of type s3 in the response:
     response_body = response.json()
@@ -14,10 +14,16 @@
 # limitations under the License.
 """Module for batch processing related code"""
 
+import heapq
+import os
+import random
 from abc import ABC, abstractmethod
+from asyncio import Queue, create_task, gather, sleep
+from collections.abc import AsyncGenerator
 from dataclasses import dataclass, field
 from pathlib import Path
-from time import perf_counter, sleep
+from time import perf_counter
+from typing import Optional
 
 import httpx
 
@@ -27,7 +33,6 @@ from ghga_connector.core import (
     WorkPackageAccessor,
     exceptions,
 )
-from ghga_connector.core.api_calls import is_service_healthy
 
 from .api_calls import (
     get_download_url,
@@ -35,6 +40,11 @@ from .api_calls import (
 )
 from .structs import RetryResponse, URLResponse
 
+# user responses (in lower case) that confirm to proceed with a batch process
+AFFIRMATIVE_RESPONSES = frozenset(("yes", "y"))
+# maximum random delay added to the retry time suggested by the server (as a fraction)
+RETRY_JITTER = 0.25
+
 
 class InputHandler(ABC):
     """Abstract base for dealing with user input in batch processing"""
@@ -80,12 +90,19 @@ class CliInputHandler(InputHandler):
     """CLI relevant input handling"""
 
     def get_input(self, *, message: str) -> str:
-        """Simple user input handling."""
-        return input(message)
+        """Simple user input handling.
+
+        If the input is closed, e.g. when running non-interactively, an empty
+        response is returned, which is treated as declining.
+        """
+        try:
+            return input(message)
+        except EOFError:
+            return ""
 
     def handle_response(self, *, response: str):
         """Handle response from get_input."""
-        if not (response.lower() == "yes" or response.lower() == "y"):
+        if response.strip().lower() not in AFFIRMATIVE_RESPONSES:
             raise exceptions.AbortBatchProcessError()
 
 
@@ -97,19 +114,21 @@ class LocalOutputHandler(OutputHandler):
 
     def check_output(self, *, location: Path) -> list[str]:
         """Check for and return existing files in output directory."""
-        existing_files = []
+        if not self.file_ids_with_extension:
+            return []
+        # list the directory once instead of checking every single file
+        try:
+            with os.scandir(location) as entries:
+                existing_names = {entry.name for entry in entries}
+        except FileNotFoundError:
+            return []
 
         # check local files with and without extension
-        for file_id, file_extension in self.file_ids_with_extension.items():
-            if file_extension:
-                file = location / f"{file_id}{file_extension}.c4gh"
-            else:
-                file = location / f"{file_id}.c4gh"
-
-            if file.exists():
-                existing_files.append(file_id)
-
-        return existing_files
+        return [
+            file_id
+            for file_id, file_extension in self.file_ids_with_extension.items()
+            if f"{file_id}{file_extension or ''}.c4gh" in existing_names
+        ]
 
 
 @dataclass
@@ -151,27 +170,31 @@ class FileStager:
         """Initialize the FileStager."""
         self.io_handler = CliIoHandler()
         existing_file_ids = set(self.io_handler.check_output(location=output_dir))
-        if not is_service_healthy(dcs_api_url):
-            raise exceptions.ApiNotReachableError(api_url=dcs_api_url)
         self.api_url = dcs_api_url
         self.message_display = message_display
         self.work_package_accessor = work_package_accessor
         self.max_wait_time = config.max_wait_time
+        self.max_concurrent_checks = config.max_concurrent_downloads
         self.client = client
         self.started_waiting = now = perf_counter()
 
         # Successfully staged files with their download URLs and sizes
-        # in the beginning, consider all files as staged with a retry time of 0
         self.staged_urls: dict[str, URLResponse] = {}
-        # Files that are currently being staged with retry times:
-        self.unstaged_retry_times = {
-            file_id: now
+        # Files that are currently being staged as a min-heap of (retry time, file ID)
+        # in the beginning, consider all files as due for a check right away
+        self.unstaged_retry_heap: list[tuple[float, str]] = [
+            (now, file_id)
             for file_id in wanted_file_ids
             if file_id not in existing_file_ids
-        }
+        ]
+        heapq.heapify(self.unstaged_retry_heap)
         # Files that could not be staged because they cannot be found:
         self.missing_files: list[str] = []
         self.ignore_failed = False
+        # IDs of staged files handed out by `iter_staged_files`, if it is running
+        self._staged_file_ids: Optional[Queue[Optional[str]]] = None
+        # whether a file handed out by `iter_staged_files` is being downloaded
+        self._downloading = False
 
     async def get_staged_files(self) -> dict[str, URLResponse]:
         """Get files that are already staged.
@@ -180,27 +203,82 @@ class FileStager:
         These values contain the download URLs and file sizes.
         The dict should cleared after these files have been downloaded.
         """
-        self.message_display.display("Updating list of staged files...")
-        staging_items = list(self.unstaged_retry_times.items())
-        for file_id, retry_time in staging_items:
-            if perf_counter() >= retry_time:
-                await self._check_file(file_id=file_id)
-            if len(self.staged_urls.items()) > 0:
-                self.started_waiting = perf_counter()  # reset wait timer
-                break
-        if not self.staged_urls and not self._handle_failures():
-            sleep(1)
-        self._check_timeout()
+        self._display("Updating list of staged files...")
+        # check a limited number of due files concurrently
+        retry_heap = self.unstaged_retry_heap
+        due_file_ids: list[str] = []
+        now = perf_counter()
+        while (
+            retry_heap
+            and retry_heap[0][0] <= now
+            and len(due_file_ids) < self.max_concurrent_checks
+        ):
+            due_file_ids.append(heapq.heappop(retry_heap)[1])
+        results = await gather(
+            *(self._check_file(file_id=file_id) for file_id in due_file_ids),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        if self.staged_urls:
+            self.started_waiting = perf_counter()  # reset wait timer
+        elif not await self._handle_failures():
+            await sleep(self._time_until_next_retry())
+        await self._check_timeout()
         return self.staged_urls
 
+    async def iter_staged_files(self) -> AsyncGenerator[str, None]:
+        """Yield the IDs of staged files while the remaining files are being staged.
+
+        Staging is polled in a background task, so a staged file can be downloaded
+        while the other files are still being staged. Errors raised while polling
+        are reraised after all files that were staged before have been yielded.
+        The generator must be closed explicitly when the caller stops early.
+        """
+        queue: Queue[Optional[str]] = Queue()
+        self._staged_file_ids = queue
+        poller = create_task(self._poll_staged_files(queue))
+        try:
+            while (file_id := await queue.get()) is not None:
+                self._downloading = True
+                try:
+                    yield file_id
+                finally:
+                    self._downloading = False
+                self.started_waiting = perf_counter()  # a download finished
+                queue.task_done()
+            await poller
+        finally:
+            poller.cancel()
+            self._staged_file_ids = None
+
+    async def _poll_staged_files(self, queue: Queue[Optional[str]]) -> None:
+        """Put the IDs of newly staged files into the queue until work is finished.
+
+        A `None` sentinel is put into the queue when polling stops for any reason.
+        """
+        try:
+            while not self.finished:
+                staged_urls = await self.get_staged_files()
+                for file_id in staged_urls:
+                    queue.put_nowait(file_id)
+                staged_urls.clear()
+        finally:
+            queue.put_nowait(None)
+
     @property
     def finished(self) -> bool:
-        """Check whether work is finished, i.e. no staged or unstaged files remain."""
-        return not (self.staged_urls or self.unstaged_retry_times)
+        """Check whether work is finished, i.e. no staged or unstaged files remain.
+
+        Missing files count as unfinished until the user decided how to proceed.
+        """
+        return not (self.staged_urls or self.unstaged_retry_heap or self.missing_files)
 
     async def _check_file(self, file_id: str) -> None:
         """Check whether a file with the given file_id is staged.
 
+        The file must already have been removed from the retry heap.
         The method returns nothing, but adapts the internal state accordingly.
         Particularly, files that cannot be found are added to missing_files.
         If files cannot be staged for other reason, a BadResponseCodeError is raised.
@@ -219,24 +297,54 @@ class FileStager:
                 raise
             response = None
         if isinstance(response, URLResponse):
-            del self.unstaged_retry_times[file_id]
             self.staged_urls[file_id] = response
-            self.message_display.display(f"File {file_id} is ready for download.")
+            self._display(f"File {file_id} is ready for download.")
         elif isinstance(response, RetryResponse):
-            self.unstaged_retry_times[file_id] = perf_counter() + response.retry_after
-            self.message_display.display(f"File {file_id} is (still) being staged.")
+            # add jitter so that clients do not retry in lockstep
+            retry_after = response.retry_after
+            jitter = random.uniform(0, retry_after * RETRY_JITTER)  # noqa: S311
+            retry_time = perf_counter() + retry_after + jitter
+            heapq.heappush(self.unstaged_retry_heap, (retry_time, file_id))
+            self._display(f"File {file_id} is (still) being staged.")
         else:
             self.missing_files.append(file_id)
 
-    def _check_timeout(self):
+    def _display(self, message: str) -> None:
+        """Display a staging message, unless a download is running.
+
+        Staging is polled in the background while a file is being downloaded, and
+        its messages would break up the progress bar of the download.
+        """
+        if not self._downloading:
+            self.message_display.display(message)
+
+    def _time_until_next_retry(self) -> float:
+        """Get the number of seconds until the next unstaged file is due for a check.
+
+        The result is capped so that waiting never overshoots the maximum wait time.
+        """
+        if not self.unstaged_retry_heap:
+            return 0
+        now = perf_counter()
+        next_retry = self.unstaged_retry_heap[0][0] - now
+        remaining_wait = self.started_waiting + self.max_wait_time - now
+        return max(0, min(next_retry, remaining_wait))
+
+    async def _check_timeout(self):
         """Check whether we have waited too long for the files to be staged.
 
         In that cases, a MaxWaitTimeExceededError is raised.
+        Time spent downloading already staged files does not count as waiting.
         """
-        if perf_counter() - self.started_waiting >= self.max_wait_time:
-            raise exceptions.MaxWaitTimeExceededError(max_wait_time=self.max_wait_time)
-
-    def _handle_failures(self) -> bool:
+        if perf_counter() - self.started_waiting < self.max_wait_time:
+            return
+        if self._staged_file_ids is not None:
+            await self._staged_file_ids.join()
+            if perf_counter() - self.started_waiting < self.max_wait_time:
+                return
+        raise exceptions.MaxWaitTimeExceededError(max_wait_time=self.max_wait_time)
+
+    async def _handle_failures(self) -> bool:
         """Handle failed downloads and either abort or proceed based on user input.
 
         Returns whether there was user interaction.
@@ -244,11 +352,12 @@ class FileStager:
         """
         if not self.missing_files or self.ignore_failed:
             return False
+        if self._staged_file_ids is not None:
+            # let the downloads of already staged files finish before reporting
+            await self._staged_file_ids.join()
         missing = ", ".join(self.missing_files)
         message = f"No download exists for the following file IDs: {missing}"
         self.message_display.failure(message)
-        if self.finished:
-            return False
         unknown_ids_present = (
             "Some of the provided file IDs cannot be downloaded."
             + "\nDo you want to proceed ?\n[Yes][No]\n"
@@ -17,16 +17,17 @@
 
 import asyncio
 import base64
-import gc
-from asyncio import PriorityQueue, Queue, Semaphore, Task, create_task
-from collections.abc import Coroutine
-from io import BufferedWriter
+import os
+from asyncio import Future, Lock, Task, create_task
+from collections.abc import Awaitable, Callable, Coroutine, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 import httpx
 from tenacity import RetryError
 
+from ghga_connector.constants import DOWNLOAD_CHUNK_SIZE
 from ghga_connector.core import (
     AbstractMessageDisplay,
     PartRange,
@@ -34,7 +35,10 @@ from ghga_connector.core import (
     WorkPackageAccessor,
     calc_part_ranges,
     exceptions,
+    open_for_positional_writes,
+    preallocate,
     retry_handler,
+    write_at,
 )
 
 from .abstract_downloader import DownloaderBase
@@ -42,6 +46,7 @@ from .api_calls import (
     get_download_url,
     get_envelope_authorization,
     get_file_authorization,
+    raise_unauthorized_error,
 )
 from .progress_bar import ProgressBar
 from .structs import RetryResponse, URLResponse
@@ -85,6 +90,11 @@ class TaskHandler:
         """Await all remaining tasks."""
         await asyncio.gather(*self._tasks)
 
+    async def cancel_and_wait(self):
+        """Cancel all running tasks and wait until they are done."""
+        self.cancel_tasks()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
 
 class Downloader(DownloaderBase):
     """Centralized high-level interface for download functionality. Used in the core.
@@ -106,8 +116,10 @@ class Downloader(DownloaderBase):
         self._max_wait_time = max_wait_time
         self._message_display = message_display
         self._work_package_accessor = work_package_accessor
-        self._queue: Queue[tuple[int, bytes]] = PriorityQueue()
-        self._semaphore = Semaphore(value=max_concurrent_downloads)
+        self._max_concurrent_downloads = max_concurrent_downloads
+        # download URL shared by all part downloads, only replaced when it expires
+        self._url_response: Optional[URLResponse] = None
+        self._url_lock = Lock()
 
     async def download_file(self, *, output_path: Path, part_size: int):
         """Download file to the specified location and manage lower level details."""
@@ -115,55 +127,64 @@ class Downloader(DownloaderBase):
         self._message_display.display(
             f"Fetching work order token and download URL for {self._file_id}"
         )
-        url_response = await self.fetch_download_url()
+        url_response = self._url_response = await self.fetch_download_url()
         part_ranges = calc_part_ranges(
             part_size=part_size, total_file_size=url_response.file_size
         )
 
-        task_handler = TaskHandler()
-
-        # start async part download to intermediate queue
-        for part_range in part_ranges:
-            task_handler.schedule(self.download_to_queue(part_range=part_range))
-
-        # get file header envelope
+        fd = open_for_positional_writes(output_path)
         try:
-            envelope = await self.get_file_header_envelope()
-        except (
-            exceptions.FileNotRegisteredError,
-            exceptions.EnvelopeNotFoundError,
-            exceptions.ExternalApiError,
-        ) as error:
-            # Cancel running tasks before raising
-            task_handler.cancel_tasks()
-            raise exceptions.GetEnvelopeError() from error
-
-        # Write the downloaded parts to a file
-        with (
-            output_path.open("wb") as file,
-            ProgressBar(
-                file_name=file.name, file_size=url_response.file_size
-            ) as progress_bar,
-        ):
-            # put envelope in file
-            file.write(envelope)
-            # start download task
-            write_to_file = Task(
-                self.drain_queue_to_file(
-                    file=file,
-                    file_size=url_response.file_size,
-                    offset=len(envelope),
-                    progress_bar=progress_bar,
-                ),
-                name="Write queue to file",
-            )
-            try:
-                await task_handler.gather()
-            except:
-                write_to_file.cancel()
-                raise
-            else:
-                await write_to_file
+            with ProgressBar(
+                file_name=str(output_path), file_size=url_response.file_size
+            ) as progress_bar:
+                # parts are written after the envelope, which is not known yet
+                offset: Future[int] = asyncio.get_running_loop().create_future()
+                task_handler = TaskHandler()
+                try:
+                    # start a fixed number of workers downloading parts directly to
+                    # the file, instead of one task per part
+                    for _ in range(self._max_concurrent_downloads):
+                        task_handler.schedule(
+                            self._download_parts(
+                                part_ranges=part_ranges,
+                                fd=fd,
+                                offset=offset,
+                                progress_bar=progress_bar,
+                            )
+                        )
+
+                    # get file header envelope
+                    try:
+                        envelope = await self.get_file_header_envelope()
+                    except (
+                        exceptions.FileNotRegisteredError,
+                        exceptions.EnvelopeNotFoundError,
+                        exceptions.ExternalApiError,
+                    ) as error:
+                        raise exceptions.GetEnvelopeError() from error
+
+                    # extending the file can be slow on network file systems, so do it
+                    # in a thread. Leaving the executor waits for that thread, even on
+                    # cancellation, so the file is never closed while it is in use.
+                    with ThreadPoolExecutor(max_workers=1) as executor:
+                        await asyncio.get_running_loop().run_in_executor(
+                            executor,
+                            preallocate,
+                            fd,
+                            len(envelope) + url_response.file_size,
+                        )
+
+                    # put envelope in file and let the part downloads write after it
+                    write_at(fd, envelope, 0)
+                    offset.set_result(len(envelope))
+                    await task_handler.gather()
+                except BaseException:
+                    # the workers may be waiting for the offset with an open stream,
+                    # make sure they are gone before the file is closed
+                    await task_handler.cancel_and_wait()
+                    raise
+        finally:
+            os.close(fd)
 
     async def fetch_download_url(self) -> URLResponse:
         """Fetch a work order token and retrieve the download url.
@@ -220,13 +241,7 @@ class Downloader(DownloaderBase):
 
         # For now unauthorized responses are not handled by httpyexpect
         if status_code == 403:
-            content = response.json()
-            # handle both normal and httpyexpect 403 response
-            try:
-                cause = content["description"]
-            except KeyError:
-                cause = content["detail"]
-            raise exceptions.UnauthorizedAPICallError(url=url, cause=cause)
+            raise_unauthorized_error(url=url, response=response)
 
         spec = {
             404: {
@@ -243,42 +258,134 @@ class Downloader(DownloaderBase):
         ResponseExceptionTranslator(spec=spec).handle(response=response)
         raise exceptions.BadResponseCodeError(url=url, response_code=status_code)
 
-    async def download_to_queue(self, *, part_range: PartRange) -> None:
+    async def _download_parts(
+        self,
+        *,
+        part_ranges: Iterator[PartRange],
+        fd: int,
+        offset: Future[int],
+        progress_bar: ProgressBar,
+    ) -> None:
+        """Download parts taken from the given iterator until it is exhausted.
+
+        All workers share the same iterator, so each part is downloaded only once.
+        """
+        for part_range in part_ranges:
+            await self.download_part(
+                part_range=part_range,
+                fd=fd,
+                offset=offset,
+                progress_bar=progress_bar,
+            )
+
+    async def download_part(
+        self,
+        *,
+        part_range: PartRange,
+        fd: int,
+        offset: Future[int],
+        progress_bar: ProgressBar,
+    ) -> None:
         """
-        Start downloading file parts in parallel into a queue.
-        This should be wrapped into  asyncio.task and is guarded by a semaphore to limit
-        the amount of ongoing parallel downloads to max_concurrent_downloads.
+        Download a file part and write it to the file with the given descriptor.
+        The parts are downloaded by a fixed pool of max_concurrent_downloads workers,
+        which limits the amount of ongoing parallel downloads.
+        The part is written after the given offset, which will be resolved once the
+        file header envelope has been written. The download can start before that.
         """
-        # Guard with semaphore to ensure only a set amount of downloads runs in parallel
-        async with self._semaphore:
-            url_and_headers = await self.fetch_download_url()
-            url = url_and_headers.download_url
-            try:
-                await self.download_content_range(
-                    url=url, start=part_range.start, end=part_range.stop
-                )
-            except Exception as exception:
-                raise exceptions.DownloadError(reason=str(exception)) from exception
+        url = await self.get_cached_download_url()
+        try:
+            await self.download_content_range(
+                url=url,
+                start=part_range.start,
+                end=part_range.stop,
+                fd=fd,
+                offset=offset,
+                progress_bar=progress_bar,
+            )
+        except Exception as exception:
+            raise exceptions.DownloadError(reason=str(exception)) from exception
 
-    async def download_content_range(
+    async def get_cached_download_url(
+        self, *, expired_url: Optional[str] = None
+    ) -> str:
+        """Get the download URL, fetching it only if there is no cached URL yet.
+
+        If an `expired_url` is passed, a new URL is fetched instead, unless another
+        part download has already replaced the expired URL in the meantime.
+        """
+        async with self._url_lock:
+            url_response = self._url_response
+            if url_response is None or url_response.download_url == expired_url:
+                url_response = self._url_response = await self.fetch_download_url()
+            return url_response.download_url
+
+    async def download_content_range(  # noqa: PLR0913
         self,
         *,
         url: str,
         start: int,
         end: int,
+        fd: int,
+        offset: Future[int],
+        progress_bar: ProgressBar,
     ) -> None:
-        """Download a specific range of a file's content using a presigned download url."""
-        headers = httpx.Headers(
-            {
-                "Range": f"bytes={start}-{end}",
+        """Download a specific range of a file's content using a presigned download url.
+
+        The content is streamed in chunks that are written to the file with the given
+        descriptor, shifted by the given offset, so that a part never needs to be held
+        in memory as a whole. The request is sent right away, but writing waits until
+        the offset has been resolved. If a retry is needed while streaming, the
+        download resumes after the last chunk that has been written. This also holds
+        if the presigned URL has expired, in which case it is replaced once.
+        """
+        position = start
+        url_replaced = False
+
+        async def stream_remaining_range() -> httpx.Response:
+            nonlocal position
+            headers = {
+                "Range": f"bytes={position}-{end}",
                 "Cache-Control": "no-store",  # don't cache part downloads
             }
-        )
+            async with self._client.stream("GET", url, headers=headers) as response:
+                if response.status_code in (200, 206):
+                    payload_offset = await offset
+                    async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        # write on the event loop, so no write can be in progress
+                        # when the file is closed after the tasks were cancelled
+                        write_at(fd, chunk, payload_offset + position)
+                        position += len(chunk)
+                        progress_bar.advance(len(chunk))
+            return response
+
+        while True:
+            response = await self._retry_stream(stream_remaining_range, url=url)
+            status_code = response.status_code
+
+            # 200, if the full file was returned, 206 else.
+            if status_code in (200, 206):
+                return
+
+            if status_code != 403 or url_replaced:
+                raise exceptions.BadResponseCodeError(
+                    url=url, response_code=status_code
+                )
+
+            # the presigned URL has probably expired, continue with a new one from
+            # the current position, since earlier chunks were already written
+            url = await self.get_cached_download_url(expired_url=url)
+            url_replaced = True
 
+    async def _retry_stream(
+        self, stream: Callable[[], Awaitable[httpx.Response]], *, url: str
+    ) -> httpx.Response:
+        """Call the given streaming function with retries and return its response.
+
+        If the retries are exhausted, the last error is translated and raised.
+        """
         try:
-            response: httpx.Response = await retry_handler(
-                fn=self._client.get, url=url, headers=headers
-            )
+            return await retry_handler(fn=stream)
         except RetryError as retry_error:
             wrapped_exception = retry_error.last_attempt.exception()
 
@@ -290,42 +397,6 @@ class Downloader(DownloaderBase):
             elif wrapped_exception:
                 raise wrapped_exception from retry_error
             elif result := retry_error.last_attempt.result():
-                response = result
+                return result
             else:
                 raise
-
-        status_code = response.status_code
-
-        # 200, if the full file was returned, 206 else.
-        if status_code in (200, 206):
-            await self._queue.put((start, response.content))
-            return
-
-        raise exceptions.BadResponseCodeError(url=url, response_code=status_code)
-
-    async def drain_queue_to_file(
-        self,
-        *,
-        file: BufferedWriter,
-        file_size: int,
-        offset: int,
-        progress_bar: ProgressBar,
-    ) -> None:
-        """Write downloaded file bytes from queue.
-        This should be started as asyncio.Task and awaited after the download_to_queue
-        tasks have been created/started.
-        """
-        # track and display actually written bytes
-        downloaded_size = 0
-
-        while downloaded_size < file_size:
-            result = await self._queue.get()
-            start, part = result
-            file.seek(offset + start)
-            file.write(part)
-            # update tracking information
-            chunk_size = len(part)
-            downloaded_size += chunk_size
-            self._queue.task_done()
-            progress_bar.advance(chunk_size)
-            gc.collect()
@@ -17,28 +17,31 @@
 """Contains calls of the Presigned URLs in order to Up- and Download Files"""
 
 import math
+import os
 from collections.abc import Generator, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from io import BufferedReader
 from pathlib import Path
 from typing import Any
 
 from .structs import PartRange
 
+# magic number and version at the start of Crypt4GH encrypted files
+_MAGIC = b"crypt4gh" + b"\x01\x00\x00\x00"
+
 
 def is_file_encrypted(file_path: Path):
     """Checks if a file is Crypt4GH encrypted"""
-    with file_path.open("rb") as input_file:
-        num_relevant_bytes = 12
-        file_header = input_file.read(num_relevant_bytes)
-
-        magic_number = b"crypt4gh"
-        version = b"\x01\x00\x00\x00"
-
-        if file_header != magic_number + version:
-            return False
+    # read only the relevant bytes with a single call, bypassing any buffering
+    fd = os.open(file_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        # a freshly opened descriptor is at the start of the file
+        file_header = os.read(fd, len(_MAGIC))
+    finally:
+        os.close(fd)
 
     # If file header is correct, assume file is Crypt4GH encrypted
-    return True
+    return file_header == _MAGIC
 
 
 def calc_part_ranges(
@@ -51,32 +54,55 @@ def calc_part_ranges(
     in the middle of the file using the `from_part` argument. This might be useful to
     resume an interrupted reading process.
     """
-    # calc the ranges for the parts that have the full part_size:
+    # calc the ranges for the parts that have the full part_size lazily:
     full_part_number = math.floor(total_file_size / part_size)
-    part_ranges = [
-        PartRange(start=part_size * (part_no - 1), stop=part_size * part_no - 1)
-        for part_no in range(from_part, full_part_number + 1)
-    ]
+    for start in range(
+        part_size * (from_part - 1), part_size * full_part_number, part_size
+    ):
+        yield PartRange(start=start, stop=start + part_size - 1)
 
     if (total_file_size % part_size) > 0:
         # if the last part is smaller than the part_size, calculate its range separately:
-        part_ranges.append(
-            PartRange(start=part_size * full_part_number, stop=total_file_size - 1)
-        )
+        yield PartRange(start=part_size * full_part_number, stop=total_file_size - 1)
+
 
-    yield from part_ranges
+def open_for_positional_writes(path: Path) -> int:
+    """Create or truncate the file at the given path and return a descriptor for it.
+
+    The descriptor is meant to be used with `write_at` and must be closed by the
+    caller using `os.close`.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+    return os.open(path, flags, 0o666)
 
 
-def get_segments(part: bytes, segment_size: int):
-    """Chunk file part into cipher segments"""
-    full_segments = len(part) // segment_size
-    segments = [
-        part[i * segment_size : (i + 1) * segment_size] for i in range(full_segments)
-    ]
-    # get potential remainder of bytes that we need to handle
-    # for non-matching boundaries between part and cipher segment size
-    incomplete_segment = part[full_segments * segment_size :]
-    return segments, incomplete_segment
+def write_at(fd: int, data: bytes, offset: int) -> None:
+    """Write all of the given data to the file descriptor at the given offset.
+
+    Positional writes neither depend on nor move the current file position and
+    do not go through a user space buffer. Where `os.pwrite` is not available,
+    this falls back to seeking and writing.
+    """
+    view = memoryview(data)
+    while view:
+        if hasattr(os, "pwrite"):
+            written = os.pwrite(fd, view, offset)
+        else:
+            os.lseek(fd, offset, os.SEEK_SET)
+            written = os.write(fd, view)
+        view = view[written:]
+        offset += written
+
+
+def preallocate(fd: int, size: int) -> None:
+    """Extend the file with the given descriptor to its final size up front.
+
+    The file is then not extended again by every write of a part out of order.
+    posix_fallocate is not used to reserve the blocks: on file systems without
+    native support, like NFS or many FUSE mounts, glibc emulates it by writing to
+    every block, so the whole file would be written twice.
+    """
+    os.ftruncate(fd, size)
 
 
 def read_file_parts(
@@ -101,3 +127,64 @@ def read_file_parts(
             return
 
         yield file_part
+
+
+def read_file_parts_direct(
+    fd: int, *, part_size: int, from_part: int = 1
+) -> Iterator[bytes]:
+    """
+    Returns an iterator like `read_file_parts`, but reads from the file descriptor
+    using positional reads, i.e. one `os.pread` call per part, which neither depends
+    on nor moves the current file position.
+
+    Reads are limited to the file size determined with `os.fstat`, so no buffer larger
+    than the remaining content is allocated, e.g. for files smaller than a part.
+    Like `read_file_parts`, this reads until the end of the file, so the size is
+    determined again when it has been reached, in case the file has grown.
+
+    Please note: opening and closing of the file MUST happen outside of this function.
+    """
+    if hasattr(os, "posix_fadvise"):
+        # the file is streamed once from start to end, so let the kernel read ahead
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+    file_size = os.fstat(fd).st_size
+    offset = part_size * (from_part - 1)
+    while True:
+        if offset >= file_size:
+            file_size = os.fstat(fd).st_size
+            if offset >= file_size:
+                return
+        length = min(part_size, file_size - offset)
+        file_part = os.pread(fd, length, offset)
+        if not file_part:
+            return
+        # a short read does not necessarily mean that the end of file was reached
+        while len(file_part) < length:
+            rest = os.pread(fd, length - len(file_part), offset + len(file_part))
+            if not rest:
+                break
+            file_part += rest
+        offset += len(file_part)
+
+        yield file_part
+
+
+def read_file_parts_ahead(
+    file: BufferedReader, *, part_size: int, from_part: int = 1
+) -> Iterator[bytes]:
+    """
+    Returns an iterator like `read_file_parts_direct` for the descriptor of the given
+    file, but reads the next part in a background thread while the current part is
+    being processed.
+
+    Please note: opening and closing of the file MUST happen outside of this function.
+    """
+    file_parts = read_file_parts_direct(
+        file.fileno(), part_size=part_size, from_part=from_part
+    )
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_part = executor.submit(next, file_parts, None)
+        while (file_part := next_part.result()) is not None:
+            next_part = executor.submit(next, file_parts, None)
+            yield file_part
@@ -16,6 +16,7 @@
 
 """Main domain logic."""
 
+import asyncio
 from pathlib import Path
 
 import httpx
@@ -42,6 +43,7 @@ async def upload_file(  # noqa: PLR0913
     my_public_key_path: Path,
     my_private_key_path: Path,
     part_size: int,
+    max_concurrent_uploads: int,
 ) -> None:
     """Core command to upload a file. Can be called by CLI, GUI, etc."""
     if not my_public_key_path.is_file():
@@ -58,7 +60,8 @@ async def upload_file(  # noqa: PLR0913
     if is_file_encrypted(file_path):
         raise exceptions.FileAlreadyEncryptedError(file_path=file_path)
 
-    if not is_service_healthy(api_url):
+    # the health check is synchronous, so run it off the event loop
+    if not await asyncio.to_thread(is_service_healthy, api_url):
         raise exceptions.ApiNotReachableError(api_url=api_url)
 
     uploader = Uploader(
@@ -73,6 +76,7 @@ async def upload_file(  # noqa: PLR0913
             file_path=file_path,
             my_private_key_path=my_private_key_path,
             part_size=part_size,
+            max_concurrent_uploads=max_concurrent_uploads,
             server_public_key=server_public_key,
             uploader=uploader,
         )
@@ -89,6 +93,7 @@ async def upload_file(  # noqa: PLR0913
         message_display.failure(
             f"Finishing the upload with id '{file_id}' failed.\n{error.cause}"
         )
+        raise error
 
     message_display.success(f"File with id '{file_id}' has been successfully uploaded.")
 
@@ -107,10 +112,11 @@ async def download_file(  # noqa: PLR0913
     file_extension: str = "",
     overwrite: bool = False,
 ) -> None:
-    """Core command to download a file. Can be called by CLI, GUI, etc."""
-    if not is_service_healthy(api_url):
-        raise exceptions.ApiNotReachableError(api_url=api_url)
+    """Core command to download a file. Can be called by CLI, GUI, etc.
 
+    The caller is expected to have checked that the download API is reachable
+    before starting a batch of downloads.
+    """
     # construct file name with suffix, if given
     file_name = f"{file_id}"
     if file_extension:
@@ -155,8 +161,9 @@ async def download_file(  # noqa: PLR0913
         message_display.failure(f"Failed downloading with id '{file_id}'.")
         raise error
 
-    # rename fully downloaded file
-    output_file_ongoing.rename(output_file)
+    # rename fully downloaded file, off the event loop as the output directory
+    # might be located on a slow (network) file system
+    await asyncio.to_thread(output_file_ongoing.rename, output_file)
 
     message_display.success(
         f"File with id '{file_id}' has been successfully downloaded."
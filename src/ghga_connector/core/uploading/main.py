@@ -29,6 +29,7 @@ async def run_upload(  # noqa: PLR0913
     file_path: Path,
     my_private_key_path: Path,
     part_size: int,
+    max_concurrent_uploads: int,
     server_public_key: str,
     uploader: UploaderBase,
 ):
@@ -43,6 +44,7 @@ async def run_upload(  # noqa: PLR0913
         file_path=file_path,
         file_id=file_id,
         part_size=part_size,
+        max_concurrent_uploads=max_concurrent_uploads,
         uploader=uploader,
     )
 
@@ -15,11 +15,14 @@
 
 """This file contains all api calls related to uploading files"""
 
+import asyncio
 import base64
 import json
-import math
-from collections.abc import Iterator
+import os
+from collections.abc import Awaitable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
 
 import crypt4gh.keys
 import crypt4gh.lib
@@ -327,46 +330,137 @@ class Uploader(UploaderBase):
 class ChunkedUploader:
     """Handler class dealing with upload functionality"""
 
-    def __init__(
+    def __init__(  # noqa: PLR0913
         self,
         *,
         encryptor: Encryptor,
         file_id: str,
         file_path: Path,
         part_size: int,
+        max_concurrent_uploads: int,
         uploader: UploaderBase,
     ) -> None:
-        self._encrypted_file_size = 0
         self._encryptor = encryptor
         self._file_id = file_id
         self._input_path = file_path
         self._part_size = part_size
-        self._unencrypted_file_size = file_path.stat().st_size
+        self._max_concurrent_uploads = max_concurrent_uploads
         self._uploader = uploader
 
     async def encrypt_and_upload(self):
         """Delegate encryption and perform multipart upload"""
-        # compute encrypted_file_size
-        num_segments = math.ceil(
-            self._unencrypted_file_size / crypt4gh.lib.SEGMENT_SIZE
-        )
-        expected_encrypted_size = (
-            self._unencrypted_file_size + num_segments * crypt4gh.lib.CIPHER_DIFF
-        )
-
         with self._input_path.open("rb") as file:
-            for part_number, part in enumerate(
-                self._encryptor.process_file(file=file), start=1
-            ):
-                upload_url = await self._uploader.get_part_upload_url(
-                    part_no=part_number
-                )
-                await self._uploader.upload_file_part(
-                    presigned_url=upload_url, part=part
+            # take the size from the file that is actually read, without another
+            # lookup of its path
+            unencrypted_file_size = os.fstat(file.fileno()).st_size
+
+            # compute encrypted_file_size
+            # use exact integer arithmetic, floats lose precision for huge files
+            num_segments = -(-unencrypted_file_size // crypt4gh.lib.SEGMENT_SIZE)
+            expected_encrypted_size = (
+                unencrypted_file_size + num_segments * crypt4gh.lib.CIPHER_DIFF
+            )
+
+            # the envelope is never empty, so at least this number of parts follows
+            min_part_count = -(-(expected_encrypted_size + 1) // self._part_size)
+
+            encrypted_parts = self._encryptor.process_file(file=file)
+            try:
+                await self._upload_parts(
+                    encrypted_parts=encrypted_parts,
+                    min_part_count=min_part_count,
+                    expected_encrypted_size=expected_encrypted_size,
                 )
+            finally:
+                # the executor has been shut down, so the encryption is not running
+                encrypted_parts.close()
             encrypted_file_size = self._encryptor.get_encrypted_size()
             if expected_encrypted_size != encrypted_file_size:
                 raise exceptions.EncryptedSizeMismatch(
                     actual_encrypted_size=encrypted_file_size,
                     expected_encrypted_size=expected_encrypted_size,
                 )
+
+    async def _upload_parts(
+        self,
+        *,
+        encrypted_parts: Iterator[bytes],
+        min_part_count: int,
+        expected_encrypted_size: int,
+    ) -> None:
+        """Upload the given encrypted parts concurrently.
+
+        The next part is encrypted in a thread while the current ones are uploaded.
+        Upload URLs for parts that are known to exist are fetched while the parts
+        are being encrypted, instead of right before uploading them.
+        If the file grows while it is being read, more than the expected encrypted
+        size is produced. The upload is then aborted with the first part that goes
+        beyond the expected size, instead of after all parts have been uploaded.
+        """
+        uploads: set[asyncio.Task] = set()
+        upload_urls: dict[int, asyncio.Task[str]] = {}
+
+        def prefetch_upload_url(part_number: int) -> None:
+            if part_number <= min_part_count:
+                upload_urls[part_number] = asyncio.create_task(
+                    self._uploader.get_part_upload_url(part_no=part_number)
+                )
+
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                loop = asyncio.get_running_loop()
+                next_part = loop.run_in_executor(executor, next, encrypted_parts, None)
+                prefetch_upload_url(1)
+                part_number = 0
+                while (part := await next_part) is not None:
+                    encrypted_file_size = self._encryptor.get_encrypted_size()
+                    if encrypted_file_size > expected_encrypted_size:
+                        raise exceptions.EncryptedSizeMismatch(
+                            actual_encrypted_size=encrypted_file_size,
+                            expected_encrypted_size=expected_encrypted_size,
+                        )
+                    part_number += 1
+                    next_part = loop.run_in_executor(
+                        executor, next, encrypted_parts, None
+                    )
+                    prefetch_upload_url(part_number + 1)
+                    if len(uploads) >= self._max_concurrent_uploads:
+                        # wait for a running upload to finish, so that only a
+                        # limited number of encrypted parts is held in memory
+                        done, uploads = await asyncio.wait(
+                            uploads, return_when=asyncio.FIRST_COMPLETED
+                        )
+                        for upload in done:
+                            upload.result()  # reraise errors right away
+                    uploads.add(
+                        asyncio.create_task(
+                            self._upload_part(
+                                part_number=part_number,
+                                part=part,
+                                upload_url=upload_urls.pop(part_number, None),
+                            )
+                        )
+                    )
+                await asyncio.gather(*uploads)
+        finally:
+            pending = [*uploads, *upload_urls.values()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _upload_part(
+        self,
+        *,
+        part_number: int,
+        part: bytes,
+        upload_url: Optional[Awaitable[str]] = None,
+    ) -> None:
+        """Upload the part with the given number.
+
+        If no upload URL is passed that has already been requested for the part,
+        it is requested here.
+        """
+        if upload_url is None:
+            upload_url = self._uploader.get_part_upload_url(part_no=part_number)
+        presigned_url = await upload_url
+        await self._uploader.upload_file_part(presigned_url=presigned_url, part=part)
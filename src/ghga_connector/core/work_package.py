@@ -44,6 +44,8 @@ class WorkPackageAccessor:
         self.api_url = api_url
         self.client = client
         self.dcs_api_url = dcs_api_url
+        # DCS object URLs are requested per file (and part), so build the prefix once
+        self.dcs_objects_url = f"{dcs_api_url}/objects/"
         self.package_id = package_id
         self.my_private_key = my_private_key
         self.my_public_key = my_public_key
@@ -438,6 +438,7 @@ async def test_upload(
                 my_public_key_path=Path(PUBLIC_KEY_FILE),
                 my_private_key_path=Path(PRIVATE_KEY_FILE),
                 part_size=DEFAULT_PART_SIZE,
+                max_concurrent_uploads=5,
             )
 
         await s3_fixture.storage.complete_multipart_upload(
@@ -521,6 +522,7 @@ async def test_multipart_upload(
                 my_public_key_path=Path(PUBLIC_KEY_FILE),
                 my_private_key_path=Path(PRIVATE_KEY_FILE),
                 part_size=DEFAULT_PART_SIZE,
+                max_concurrent_uploads=5,
             )
 
     # confirm upload
@@ -559,6 +561,7 @@ async def test_upload_bad_url(httpx_mock: HTTPXMock, mock_external_calls):  # no
                 my_public_key_path=Path(PUBLIC_KEY_FILE),
                 my_private_key_path=Path(PRIVATE_KEY_FILE),
                 part_size=DEFAULT_PART_SIZE,
+                max_concurrent_uploads=5,
             )
 
 
@@ -16,7 +16,7 @@
 
 """Test file operations"""
 
-from asyncio import create_task
+from asyncio import Future, get_running_loop
 from unittest.mock import AsyncMock, Mock
 
 import pytest
@@ -40,16 +40,26 @@ from tests.fixtures.s3 import (  # noqa: F401
 )
 
 
+def resolved_offset(offset: int) -> Future[int]:
+    """Get the offset in the form it is passed to the Downloader"""
+    future: Future[int] = get_running_loop().create_future()
+    future.set_result(offset)
+    return future
+
+
 @pytest.mark.parametrize(
-    "start, end, file_size",
+    "start, end, file_size, offset",
     [
         # download full file as one part
-        (0, 20 * 1024 * 1024 - 1, 20 * 1024 * 1024),
+        (0, 20 * 1024 * 1024 - 1, 20 * 1024 * 1024, 0),
         (  # download intermediate part:
             5 * 1024 * 1024,
             10 * 1024 * 1024 - 1,
             20 * 1024 * 1024,
+            0,
         ),
+        # download full file as one part after a file header
+        (0, 20 * 1024 * 1024 - 1, 20 * 1024 * 1024, 124),
     ],
 )
 @pytest.mark.asyncio
@@ -57,7 +67,9 @@ async def test_download_content_range(
     start: int,
     end: int,
     file_size: int,
+    offset: int,
     s3_fixture: S3Fixture,  # noqa: F811
+    tmp_path,
 ):
     """Test the `download_content_range` function."""
     # prepare state and the expected result:
@@ -68,6 +80,7 @@ async def test_download_content_range(
     )
 
     message_display = CLIMessageDisplay()
+    file_path = tmp_path / "test.file"
     # download content range with dedicated function:
     async with async_client() as client:
         # no work package accessor calls in download_content_range, just mock for correct type
@@ -80,15 +93,23 @@ async def test_download_content_range(
             work_package_accessor=dummy_accessor,
             message_display=message_display,
         )
-        await downloader.download_content_range(url=download_url, start=start, end=end)
-
-    result = await downloader._queue.get()
-    assert not isinstance(result, BaseException)
-
-    obtained_start, obtained_bytes = result
+        progress_bar = Mock(spec=ProgressBar)
+        with file_path.open("wb") as file:
+            await downloader.download_content_range(
+                url=download_url,
+                start=start,
+                end=end,
+                fd=file.fileno(),
+                offset=resolved_offset(offset),
+                progress_bar=progress_bar,
+            )
 
-    assert start == obtained_start
-    assert expected_bytes == obtained_bytes
+    obtained_bytes = file_path.read_bytes()
+    # the content range is written at its position shifted by the offset
+    assert len(obtained_bytes) == offset + end + 1
+    assert expected_bytes == obtained_bytes[offset + start :]
+    advanced = sum(call.args[0] for call in progress_bar.advance.call_args_list)
+    assert advanced == len(expected_bytes)
 
 
 @pytest.mark.parametrize(
@@ -128,27 +149,24 @@ async def test_download_file_parts(
         downloader.fetch_download_url = mock_fetch  # type: ignore
         task_handler = TaskHandler()
 
-        for part_range in part_ranges:
-            task_handler.schedule(downloader.download_to_queue(part_range=part_range))
-
         file_path = tmp_path / "test.file"
         with (
             file_path.open("wb") as file,
             ProgressBar(file_name=file.name, file_size=total_file_size) as progress_bar,
         ):
-            dl_task = create_task(
-                downloader.drain_queue_to_file(
-                    file=file,
-                    file_size=total_file_size,
-                    offset=0,
-                    progress_bar=progress_bar,
+            offset = resolved_offset(0)
+            for part_range in part_ranges:
+                task_handler.schedule(
+                    downloader.download_part(
+                        part_range=part_range,
+                        fd=file.fileno(),
+                        offset=offset,
+                        progress_bar=progress_bar,
+                    )
                 )
-            )
             await task_handler.gather()
-            await dl_task
 
-        num_bytes_obtained = file_path.stat().st_size
-        assert num_bytes_obtained == len(expected_bytes)
+        assert file_path.read_bytes() == expected_bytes
 
         # test exception in the beginning
         downloader = Downloader(
@@ -165,34 +183,23 @@ async def test_download_file_parts(
             part_size=part_size, total_file_size=total_file_size
         )
 
-        task_handler.schedule(
-            downloader.download_to_queue(part_range=PartRange(-10000, -1))
-        )
-        task_handler.schedule(
-            downloader.download_to_queue(part_range=next(part_ranges))
-        )
-
         file_path = tmp_path / "test2.file"
         with (
             file_path.open("wb") as file,
             ProgressBar(file_name=file.name, file_size=total_file_size) as progress_bar,
         ):
-            dl_task = create_task(
-                downloader.drain_queue_to_file(
-                    file=file,
-                    file_size=total_file_size,
-                    offset=0,
-                    progress_bar=progress_bar,
+            offset = resolved_offset(0)
+            for part_range in (PartRange(-10000, -1), next(part_ranges)):
+                task_handler.schedule(
+                    downloader.download_part(
+                        part_range=part_range,
+                        fd=file.fileno(),
+                        offset=offset,
+                        progress_bar=progress_bar,
+                    )
                 )
-            )
             with pytest.raises(DownloadError):
-                try:
-                    await task_handler.gather()
-                except:
-                    dl_task.cancel()
-                    raise
-                else:
-                    await dl_task
+                await task_handler.gather()
 
         # test exception at the end
         downloader = Downloader(
@@ -209,34 +216,22 @@ async def test_download_file_parts(
             part_size=part_size, total_file_size=total_file_size
         )
         part_ranges = list(part_ranges)  # type: ignore
-        for idx, part_range in enumerate(part_ranges):
-            if idx == len(part_ranges) - 1:  # type: ignore
-                task_handler.schedule(
-                    downloader.download_to_queue(part_range=PartRange(-10000, -1))
-                )
-            else:
-                task_handler.schedule(
-                    downloader.download_to_queue(part_range=part_range)
-                )
+        part_ranges[-1] = PartRange(-10000, -1)  # type: ignore
 
         file_path = tmp_path / "test3.file"
         with (
             file_path.open("wb") as file,
             ProgressBar(file_name=file.name, file_size=total_file_size) as progress_bar,
         ):
-            dl_task = create_task(
-                downloader.drain_queue_to_file(
-                    file=file,
-                    file_size=total_file_size,
-                    offset=0,
-                    progress_bar=progress_bar,
+            offset = resolved_offset(0)
+            for part_range in part_ranges:
+                task_handler.schedule(
+                    downloader.download_part(
+                        part_range=part_range,
+                        fd=file.fileno(),
+                        offset=offset,
+                        progress_bar=progress_bar,
+                    )
                 )
-            )
             with pytest.raises(DownloadError):
-                try:
-                    await task_handler.gather()
-                except:
-                    dl_task.cancel()
-                    raise
-                else:
-                    await dl_task
+                await task_handler.gather()
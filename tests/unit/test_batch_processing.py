@@ -0,0 +1,280 @@
+# Copyright 2021 - 2024 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Tests for the staging logic used in batch processing"""
+
+import asyncio
+from pathlib import Path
+from time import perf_counter
+from unittest.mock import Mock
+
+import pytest
+
+from ghga_connector.core import WorkPackageAccessor, exceptions
+from ghga_connector.core.downloading.batch_processing import (
+    CliInputHandler,
+    FileStager,
+    LocalOutputHandler,
+)
+from ghga_connector.core.downloading.structs import RetryResponse, URLResponse
+from tests.fixtures.config import get_test_config
+
+BATCH_PROCESSING = "ghga_connector.core.downloading.batch_processing"
+
+
+def patch_download_url(monkeypatch, get_download_url):
+    """Patch the DCS calls made by the FileStager with the given download URL mock"""
+
+    async def get_file_authorization(*, file_id: str, work_package_accessor):
+        return file_id  # passed to get_download_url in place of the URL and headers
+
+    monkeypatch.setattr(
+        f"{BATCH_PROCESSING}.get_file_authorization", get_file_authorization
+    )
+    monkeypatch.setattr(f"{BATCH_PROCESSING}.get_download_url", get_download_url)
+
+
+@pytest.fixture
+def staging_api(monkeypatch) -> dict[str, int]:
+    """Mock the DCS calls made by the FileStager.
+
+    File IDs starting with 'missing' are not found, file IDs starting with 'slow'
+    need to be checked three times before they are staged and all other files are
+    staged right away. Returns the number of checks per file ID.
+    """
+    checks: dict[str, int] = {}
+
+    async def get_download_url(*, client, url_and_headers: str):
+        file_id = url_and_headers
+        checks[file_id] = checks.get(file_id, 0) + 1
+        if file_id.startswith("missing"):
+            raise exceptions.BadResponseCodeError(url=file_id, response_code=404)
+        if file_id.startswith("slow") and checks[file_id] < 3:
+            return RetryResponse(retry_after=0)
+        return URLResponse(download_url=f"https://{file_id}", file_size=1)
+
+    patch_download_url(monkeypatch, get_download_url)
+    return checks
+
+
+def make_stager(wanted_file_ids: list[str], max_wait_time: int = 2) -> FileStager:
+    """Create a FileStager for the given file IDs with mocked dependencies"""
+    return FileStager(
+        wanted_file_ids=wanted_file_ids,
+        dcs_api_url="",
+        output_dir=Path("/non/existing/path"),
+        message_display=Mock(),
+        work_package_accessor=Mock(spec=WorkPackageAccessor),
+        client=Mock(),
+        config=get_test_config(max_wait_time=max_wait_time),
+    )
+
+
+@pytest.mark.parametrize("response", ["yes", "Y", " yes\n"])
+def test_handle_affirmative_response(response: str):
+    """Test that affirmative responses are accepted regardless of case and spacing"""
+    CliInputHandler().handle_response(response=response)
+
+
+@pytest.mark.parametrize("response", ["no", "", "yess"])
+def test_handle_negative_response(response: str):
+    """Test that all other responses abort the batch process"""
+    with pytest.raises(exceptions.AbortBatchProcessError):
+        CliInputHandler().handle_response(response=response)
+
+
+def test_get_input_closed(monkeypatch):
+    """Test that closed input is treated as an empty response"""
+
+    def closed_input(message: str) -> str:
+        raise EOFError
+
+    monkeypatch.setattr("builtins.input", closed_input)
+    assert CliInputHandler().get_input(message="Proceed?") == ""
+
+
+def test_check_output(tmp_path: Path):
+    """Test that existing files with and without extension are found"""
+    for file_name in ["file_1.fastq.c4gh", "file_2.c4gh", "file_3.fastq"]:
+        (tmp_path / file_name).touch()
+    output_handler = LocalOutputHandler()
+    output_handler.file_ids_with_extension = {
+        "file_1": ".fastq",
+        "file_2": "",
+        "file_3": ".fastq",
+        "file_4": "",
+    }
+
+    assert output_handler.check_output(location=tmp_path) == ["file_1", "file_2"]
+    assert output_handler.check_output(location=tmp_path / "missing") == []
+
+
+@pytest.mark.asyncio
+async def test_iter_staged_files(staging_api: dict[str, int]):
+    """Test that all files are yielded, including those that needed retries"""
+    stager = make_stager(["file_1", "slow_file", "file_2"])
+    staged_file_ids = stager.iter_staged_files()
+    try:
+        downloaded = [file_id async for file_id in staged_file_ids]
+    finally:
+        await staged_file_ids.aclose()
+
+    assert sorted(downloaded) == ["file_1", "file_2", "slow_file"]
+    assert staging_api == {"file_1": 1, "slow_file": 3, "file_2": 1}
+    assert stager.finished
+
+
+@pytest.mark.asyncio
+async def test_iter_staged_files_overlaps_staging(staging_api: dict[str, int]):
+    """Test that files are staged while a staged file is being downloaded"""
+    stager = make_stager(["file_1", "file_2"])
+    staged_file_ids = stager.iter_staged_files()
+    try:
+        async for file_id in staged_file_ids:
+            if file_id == "file_1":
+                # simulate a download, the other file should be checked meanwhile
+                await asyncio.sleep(0.1)
+                assert "file_2" in staging_api
+    finally:
+        await staged_file_ids.aclose()
+
+
+@pytest.mark.asyncio
+async def test_iter_staged_files_quiet_while_downloading(staging_api: dict[str, int]):
+    """Test that staging messages do not interrupt the output of a download"""
+    stager = make_stager(["file_1", "slow_file"])
+    display = stager.message_display.display
+    staged_file_ids = stager.iter_staged_files()
+    try:
+        async for file_id in staged_file_ids:
+            if file_id == "file_1":
+                display.reset_mock()
+                # simulate a download, the other file is staged meanwhile
+                await asyncio.sleep(0.1)
+                assert staging_api["slow_file"] == 3
+                display.assert_not_called()
+    finally:
+        await staged_file_ids.aclose()
+
+
+@pytest.mark.parametrize("response", ["yes", "no"])
+@pytest.mark.asyncio
+async def test_iter_staged_files_missing(response: str, staging_api: dict[str, int]):
+    """Test that the user is asked how to proceed when a file cannot be found"""
+    stager = make_stager(["file_1", "missing_file"])
+    get_input = Mock(return_value=response)
+    stager.io_handler.get_input = get_input  # type: ignore
+    downloaded = []
+    staged_file_ids = stager.iter_staged_files()
+    try:
+        if response == "yes":
+            downloaded = [file_id async for file_id in staged_file_ids]
+        else:
+            with pytest.raises(exceptions.AbortBatchProcessError):
+                async for file_id in staged_file_ids:
+                    downloaded.append(file_id)
+    finally:
+        await staged_file_ids.aclose()
+
+    get_input.assert_called_once()
+    assert downloaded == ["file_1"]
+    # missing files must not be checked again after the user decided to proceed
+    assert staging_api["missing_file"] == 1
+
+
+@pytest.mark.asyncio
+async def test_iter_staged_files_timeout(monkeypatch):
+    """Test that waiting for a file that never gets staged times out"""
+
+    async def get_download_url(*, client, url_and_headers):
+        return RetryResponse(retry_after=10)
+
+    patch_download_url(monkeypatch, get_download_url)
+    stager = make_stager(["never_staged"], max_wait_time=1)
+    staged_file_ids = stager.iter_staged_files()
+    try:
+        with pytest.raises(exceptions.MaxWaitTimeExceededError):
+            async for _ in staged_file_ids:
+                pass
+    finally:
+        await staged_file_ids.aclose()
+
+
+@pytest.mark.asyncio
+async def test_get_staged_files_waits_without_blocking(monkeypatch):
+    """Test that waiting for the next staging check does not block the event loop"""
+
+    async def get_download_url(*, client, url_and_headers):
+        return RetryResponse(retry_after=1)
+
+    patch_download_url(monkeypatch, get_download_url)
+    stager = make_stager(["slow_file"])
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.1)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    started = perf_counter()
+    try:
+        staged_urls = await stager.get_staged_files()
+    finally:
+        ticker.cancel()
+
+    assert not staged_urls
+    # the stager waits until the file is due again, other tasks keep running
+    assert perf_counter() - started >= 0.9
+    assert ticks >= 5
+
+
+@pytest.mark.asyncio
+async def test_get_staged_files_checks_concurrently(monkeypatch):
+    """Test that all due files are checked concurrently"""
+
+    async def get_download_url(*, client, url_and_headers: str):
+        await asyncio.sleep(0.2)
+        return URLResponse(download_url=f"https://{url_and_headers}", file_size=1)
+
+    patch_download_url(monkeypatch, get_download_url)
+    stager = make_stager(["file_1", "file_2", "file_3"])
+    started = perf_counter()
+    staged_urls = await stager.get_staged_files()
+
+    assert sorted(staged_urls) == ["file_1", "file_2", "file_3"]
+    assert perf_counter() - started < 0.5
+
+
+@pytest.mark.asyncio
+async def test_get_staged_files_adds_jitter(monkeypatch):
+    """Test that retry times are spread out after the time suggested by the server"""
+
+    async def get_download_url(*, client, url_and_headers):
+        return RetryResponse(retry_after=100)
+
+    patch_download_url(monkeypatch, get_download_url)
+    file_ids = [f"slow_file_{n}" for n in range(5)]
+    stager = make_stager(file_ids, max_wait_time=1)
+    started = perf_counter()
+    with pytest.raises(exceptions.MaxWaitTimeExceededError):
+        await stager.get_staged_files()
+
+    retry_times = [retry_time - started for retry_time, _ in stager.unstaged_retry_heap]
+    assert len(retry_times) == len(file_ids)
+    assert all(100 <= retry_time <= 126 for retry_time in retry_times)
+    assert len(set(retry_times)) > 1
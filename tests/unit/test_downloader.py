@@ -0,0 +1,251 @@
+# Copyright 2021 - 2024 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Tests for the part downloads of the Downloader using a mocked transport"""
+
+import asyncio
+import os
+from asyncio import Future, get_running_loop
+from collections.abc import AsyncIterator, Callable
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock
+
+import httpx
+import pytest
+
+from ghga_connector.constants import DOWNLOAD_CHUNK_SIZE
+from ghga_connector.core import WorkPackageAccessor, calc_part_ranges, exceptions
+from ghga_connector.core.downloading.downloader import Downloader, TaskHandler
+from ghga_connector.core.downloading.progress_bar import ProgressBar
+from ghga_connector.core.downloading.structs import URLResponse
+
+pytestmark = pytest.mark.asyncio
+
+CONTENT = os.urandom(3 * DOWNLOAD_CHUNK_SIZE + 1000)
+EXPIRED_URL = "https://s3.example/object?signature=expired"
+VALID_URL = "https://s3.example/object?signature=valid"
+
+
+def resolved_offset(offset: int) -> Future[int]:
+    """Get the offset in the form it is passed to the Downloader"""
+    future: Future[int] = get_running_loop().create_future()
+    future.set_result(offset)
+    return future
+
+
+def get_requested_range(request: httpx.Request) -> tuple[int, int]:
+    """Get the first and last byte position from the range header of the request"""
+    first, last = request.headers["Range"].removeprefix("bytes=").split("-")
+    return int(first), int(last)
+
+
+class DroppedStream(httpx.AsyncByteStream):
+    """Response stream that breaks off after the given content"""
+
+    def __init__(self, content: bytes):
+        self._content = content
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        """Yield the content, then fail like a dropped connection"""
+        yield self._content
+        raise httpx.ReadTimeout("The connection was dropped")
+
+
+def make_downloader(handler: Callable) -> Downloader:
+    """Create a Downloader using a client with a mocked transport"""
+    return Downloader(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        file_id="test-file",
+        max_concurrent_downloads=4,
+        max_wait_time=10,
+        work_package_accessor=Mock(spec=WorkPackageAccessor),
+        message_display=Mock(),
+    )
+
+
+async def test_refresh_expired_download_url(tmp_path: Path):
+    """Test that concurrent parts fetch a new URL only once after getting a 403"""
+    requested_urls: list[str] = []
+    all_parts_requested = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        requested_urls.append(url)
+        if url == EXPIRED_URL:
+            # let all parts run into the expired URL before any of them refreshes it
+            if requested_urls.count(EXPIRED_URL) == 4:
+                all_parts_requested.set()
+            await all_parts_requested.wait()
+            return httpx.Response(403)
+        first, last = get_requested_range(request)
+        return httpx.Response(206, content=CONTENT[first : last + 1])
+
+    downloader = make_downloader(handler)
+    downloader._url_response = URLResponse(EXPIRED_URL, len(CONTENT))
+    fetch_download_url = AsyncMock(return_value=URLResponse(VALID_URL, len(CONTENT)))
+    downloader.fetch_download_url = fetch_download_url  # type: ignore
+
+    file_path = tmp_path / "test.file"
+    with file_path.open("wb") as file:
+        offset = resolved_offset(0)
+        task_handler = TaskHandler()
+        part_ranges = calc_part_ranges(
+            part_size=DOWNLOAD_CHUNK_SIZE, total_file_size=len(CONTENT)
+        )
+        for part_range in part_ranges:
+            task_handler.schedule(
+                downloader.download_part(
+                    part_range=part_range,
+                    fd=file.fileno(),
+                    offset=offset,
+                    progress_bar=Mock(spec=ProgressBar),
+                )
+            )
+        await task_handler.gather()
+
+    fetch_download_url.assert_awaited_once()
+    assert requested_urls.count(EXPIRED_URL) == 4
+    assert requested_urls.count(VALID_URL) == 4
+    assert file_path.read_bytes() == CONTENT
+
+
+async def test_resume_dropped_stream(tmp_path: Path):
+    """Test that a dropped part download resumes after the last written byte"""
+    start, end, offset = 100, len(CONTENT) - 1, 124
+    dropped_after = 2 * DOWNLOAD_CHUNK_SIZE
+    requested_ranges: list[tuple[int, int]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        first, last = get_requested_range(request)
+        requested_ranges.append((first, last))
+        if len(requested_ranges) == 1:
+            stream = DroppedStream(CONTENT[first : first + dropped_after])
+            return httpx.Response(206, stream=stream)
+        return httpx.Response(206, content=CONTENT[first : last + 1])
+
+    downloader = make_downloader(handler)
+    progress_bar = Mock(spec=ProgressBar)
+
+    file_path = tmp_path / "test.file"
+    with file_path.open("wb") as file:
+        await downloader.download_content_range(
+            url=VALID_URL,
+            start=start,
+            end=end,
+            fd=file.fileno(),
+            offset=resolved_offset(offset),
+            progress_bar=progress_bar,
+        )
+
+    assert requested_ranges == [(start, end), (start + dropped_after, end)]
+    # the content range is written at its position shifted by the offset
+    assert file_path.read_bytes()[offset + start :] == CONTENT[start:]
+    advanced = sum(call.args[0] for call in progress_bar.advance.call_args_list)
+    assert advanced == end - start + 1
+
+
+async def test_resume_after_expired_download_url(tmp_path: Path):
+    """Test that a part download resumes at the written position with a new URL"""
+    start, end = 0, len(CONTENT) - 1
+    dropped_after = 2 * DOWNLOAD_CHUNK_SIZE
+    requests: list[tuple[str, int, int]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        first, last = get_requested_range(request)
+        requests.append((str(request.url), first, last))
+        if len(requests) == 1:
+            stream = DroppedStream(CONTENT[first : first + dropped_after])
+            return httpx.Response(206, stream=stream)
+        if str(request.url) == EXPIRED_URL:
+            return httpx.Response(403)
+        return httpx.Response(206, content=CONTENT[first : last + 1])
+
+    downloader = make_downloader(handler)
+    downloader._url_response = URLResponse(EXPIRED_URL, len(CONTENT))
+    fetch_download_url = AsyncMock(return_value=URLResponse(VALID_URL, len(CONTENT)))
+    downloader.fetch_download_url = fetch_download_url  # type: ignore
+    progress_bar = Mock(spec=ProgressBar)
+
+    file_path = tmp_path / "test.file"
+    with file_path.open("wb") as file:
+        await downloader.download_content_range(
+            url=EXPIRED_URL,
+            start=start,
+            end=end,
+            fd=file.fileno(),
+            offset=resolved_offset(0),
+            progress_bar=progress_bar,
+        )
+
+    fetch_download_url.assert_awaited_once()
+    assert requests == [
+        (EXPIRED_URL, start, end),
+        (EXPIRED_URL, start + dropped_after, end),
+        (VALID_URL, start + dropped_after, end),
+    ]
+    assert file_path.read_bytes() == CONTENT
+    advanced = sum(call.args[0] for call in progress_bar.advance.call_args_list)
+    assert advanced == end - start + 1
+
+
+class TrackedStream(httpx.AsyncByteStream):
+    """Response stream that records whether it has been closed"""
+
+    def __init__(self, content: bytes, closed_streams: list[bool]):
+        self._content = content
+        self._closed_streams = closed_streams
+        closed_streams.append(False)
+        self._index = len(closed_streams) - 1
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        """Yield the content at once"""
+        yield self._content
+
+    async def aclose(self) -> None:
+        """Record that the stream has been closed"""
+        self._closed_streams[self._index] = True
+
+
+async def test_envelope_failure_stops_part_downloads(tmp_path: Path):
+    """Test that part downloads waiting for the envelope are cleaned up on failure"""
+    closed_streams: list[bool] = []
+    all_parts_requested = asyncio.Event()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        first, last = get_requested_range(request)
+        stream = TrackedStream(CONTENT[first : last + 1], closed_streams)
+        if len(closed_streams) == 4:
+            all_parts_requested.set()
+        return httpx.Response(206, stream=stream)
+
+    async def get_file_header_envelope() -> bytes:
+        # fail only once the part downloads are waiting for the envelope
+        await all_parts_requested.wait()
+        raise exceptions.UnauthorizedAPICallError(url=VALID_URL, cause="test")
+
+    downloader = make_downloader(handler)
+    downloader.fetch_download_url = AsyncMock(  # type: ignore
+        return_value=URLResponse(VALID_URL, len(CONTENT))
+    )
+    downloader.get_file_header_envelope = get_file_header_envelope  # type: ignore
+
+    with pytest.raises(exceptions.UnauthorizedAPICallError):
+        await downloader.download_file(
+            output_path=tmp_path / "test.file", part_size=DOWNLOAD_CHUNK_SIZE
+        )
+
+    assert asyncio.all_tasks() == {asyncio.current_task()}
+    assert closed_streams == [True] * 4
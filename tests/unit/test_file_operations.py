@@ -17,6 +17,7 @@
 """Test file operations"""
 
 import base64
+import hashlib
 import os
 from pathlib import Path
 from tempfile import NamedTemporaryFile
@@ -26,13 +27,22 @@ import crypt4gh.keys
 import pytest
 from ghga_service_commons.utils.temp_files import big_temp_file
 
-from ghga_connector.core import is_file_encrypted, read_file_parts
-from ghga_connector.core.crypt import Crypt4GHDecryptor, Crypt4GHEncryptor
+from ghga_connector.core import (
+    is_file_encrypted,
+    open_for_positional_writes,
+    preallocate,
+    read_file_parts,
+    read_file_parts_ahead,
+    read_file_parts_direct,
+    write_at,
+)
+from ghga_connector.core.crypt import Checksums, Crypt4GHDecryptor, Crypt4GHEncryptor
 
 
+@pytest.mark.parametrize("read_parts", (read_file_parts, read_file_parts_ahead))
 @pytest.mark.parametrize("from_part", (None, 3))
-def test_read_file_parts(from_part: Union[int, None]):
-    """Test reading a full file with the `read_file_parts` function."""
+def test_read_file_parts(from_part: Union[int, None], read_parts):
+    """Test reading a full file with the `read_file_parts` functions."""
     file_size = 20 * 1024 * 1024
     part_size = 5 * 1024 * 1024
 
@@ -46,9 +56,9 @@ def test_read_file_parts(from_part: Union[int, None]):
         # read the file in parts:
         obtained_content = b""
         file_parts = (
-            read_file_parts(file, part_size=part_size)  # type: ignore
+            read_parts(file, part_size=part_size)  # type: ignore
             if from_part is None
-            else read_file_parts(file, part_size=part_size, from_part=from_part)  # type: ignore
+            else read_parts(file, part_size=part_size, from_part=from_part)  # type: ignore
         )
 
         for part in file_parts:
@@ -57,14 +67,76 @@ def test_read_file_parts(from_part: Union[int, None]):
         assert expected_content == obtained_content
 
 
+def test_read_file_parts_direct(tmp_path: Path):
+    """Test reading parts with `read_file_parts_direct` regardless of file position."""
+    file_path = tmp_path / "test.file"
+    content = os.urandom(10_000)
+    file_path.write_bytes(content)
+
+    with file_path.open("rb") as file:
+        file.seek(5_000)  # must not be taken into account
+        file_parts = list(
+            read_file_parts_direct(file.fileno(), part_size=3_000, from_part=2)
+        )
+
+    assert [len(part) for part in file_parts] == [3_000, 3_000, 1_000]
+    assert b"".join(file_parts) == content[3_000:]
+
+
+def test_read_file_parts_direct_grown_file(tmp_path: Path):
+    """Test that `read_file_parts_direct` reads content appended while reading."""
+    file_path = tmp_path / "test.file"
+    content = os.urandom(7_000)
+    appended_content = os.urandom(4_000)
+    file_path.write_bytes(content)
+
+    with file_path.open("rb") as file:
+        file_parts = read_file_parts_direct(file.fileno(), part_size=3_000)
+        obtained_content = next(file_parts)
+        with file_path.open("ab") as appending_file:
+            appending_file.write(appended_content)
+        for part in file_parts:
+            obtained_content += part
+
+    assert obtained_content == content + appended_content
+
+
+def test_write_at(tmp_path: Path):
+    """Test writing parts out of order to a preallocated file with `write_at`."""
+    file_path = tmp_path / "test.file"
+    file_path.write_bytes(b"previous content that must be truncated")
+    parts = [b"header", b"first part", b"second part"]
+    offsets = [0, 6, 16]
+
+    fd = open_for_positional_writes(file_path)
+    try:
+        preallocate(fd, len(b"".join(parts)))
+        for part, offset in reversed(list(zip(parts, offsets))):
+            write_at(fd, part, offset)
+    finally:
+        os.close(fd)
+
+    assert file_path.read_bytes() == b"".join(parts)
+
+
+KEY_DIR = Path(__file__).parent.parent / "fixtures" / "keypair"
+
+
+def make_encryptor(*, part_size: int, checksums: Union[Checksums, None] = None):
+    """Create an encryptor for the test keypair"""
+    pubkey = crypt4gh.keys.get_public_key(KEY_DIR / "key.pub")
+    return Crypt4GHEncryptor(
+        part_size=part_size,
+        server_public_key=base64.b64encode(pubkey).decode("utf-8"),
+        private_key_path=KEY_DIR / "key.sec",
+        checksums=checksums,
+    )
+
+
 def test_encryption_decryption():
     """Encrypt and decrypt a file to check if it is actually encrypted"""
     file_size = 20 * 1024 * 1024
-    key_dir = Path(__file__).parent.parent / "fixtures" / "keypair"
-    pubkey_path = key_dir / "key.pub"
-    private_key_path = key_dir / "key.sec"
-
-    pubkey = base64.b64encode(crypt4gh.keys.get_public_key(pubkey_path)).decode("utf-8")
+    private_key_path = KEY_DIR / "key.sec"
 
     with NamedTemporaryFile() as in_file:
         with NamedTemporaryFile() as encrypted_file:
@@ -74,11 +146,7 @@ def test_encryption_decryption():
                 in_file.seek(0)
 
                 # produce encrypted file
-                encryptor = Crypt4GHEncryptor(
-                    part_size=8 * 1024**3,
-                    server_public_key=pubkey,
-                    private_key_path=private_key_path,
-                )
+                encryptor = make_encryptor(part_size=8 * 1024**3)
 
                 for chunk in encryptor.process_file(file=in_file):  # type: ignore
                     encrypted_file.write(chunk)
@@ -94,3 +162,43 @@ def test_encryption_decryption():
                 )
 
                 assert in_file.read() == out_file.read()
+
+
+def test_encrypted_checksums_exclude_envelope(tmp_path: Path):
+    """Test that the checksums of the encrypted parts don't cover the envelope"""
+    part_size = 1024 * 1024
+    file_path = tmp_path / "test.file"
+    file_path.write_bytes(os.urandom(part_size * 5 // 2))
+    checksums = Checksums()
+    encryptor = make_encryptor(part_size=part_size, checksums=checksums)
+
+    with file_path.open("rb") as file:
+        parts = list(encryptor.process_file(file=file))  # type: ignore
+
+    envelope_size = sum(map(len, parts)) - encryptor.get_encrypted_size()
+    assert envelope_size > 0
+    assert parts[0].startswith(b"crypt4gh")
+    contents = [parts[0][envelope_size:], *parts[1:]]
+    _, encrypted_md5, encrypted_sha256 = checksums.get()
+    assert encrypted_md5 == [hashlib.md5(part).hexdigest() for part in contents]
+    assert encrypted_sha256 == [hashlib.sha256(part).hexdigest() for part in contents]
+
+
+def test_encryptors_do_not_share_checksums(tmp_path: Path):
+    """Test that encryptors without explicit checksums calculate them separately"""
+    file_path = tmp_path / "test.file"
+    content = os.urandom(1000)
+    file_path.write_bytes(content)
+    first_encryptor = make_encryptor(part_size=1024 * 1024)
+    second_encryptor = make_encryptor(part_size=1024 * 1024)
+
+    with file_path.open("rb") as file:
+        for _ in first_encryptor.process_file(file=file):  # type: ignore
+            pass
+
+    first_checksums = first_encryptor._checksums.get()
+    assert first_checksums[0] == hashlib.sha256(content).hexdigest()
+    assert len(first_checksums[1]) == 1
+    second_checksums = second_encryptor._checksums.get()
+    assert second_checksums[0] == hashlib.sha256().hexdigest()
+    assert second_checksums[1] == second_checksums[2] == []
@@ -0,0 +1,222 @@
+# Copyright 2021 - 2024 Universität Tübingen, DKFZ, EMBL, and Universität zu Köln
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Tests for the concurrent part uploads of the ChunkedUploader"""
+
+import asyncio
+import base64
+import os
+from pathlib import Path
+from typing import Union
+from unittest.mock import Mock
+
+import crypt4gh.keys
+import pytest
+
+from ghga_connector.core import exceptions
+from ghga_connector.core.crypt import Crypt4GHDecryptor, Crypt4GHEncryptor
+from ghga_connector.core.uploading.abstract_uploader import UploaderBase
+from ghga_connector.core.uploading.uploader import ChunkedUploader
+
+pytestmark = pytest.mark.asyncio
+
+KEY_DIR = Path(__file__).parent.parent / "fixtures" / "keypair"
+PART_SIZE = 1024 * 1024
+URL_PREFIX = "https://s3.example/parts/"
+
+
+class PartUploads:
+    """Keeps the uploaded parts and records the running part uploads.
+
+    The upload of the part with number `failing_part` fails. Part uploads take
+    `upload_time` seconds, the failing one fails right away.
+    """
+
+    def __init__(
+        self, *, upload_time: float = 0.1, failing_part: Union[int, None] = None
+    ):
+        self.upload_time = upload_time
+        self.failing_part = failing_part
+        self.uploaded_parts: dict[int, bytes] = {}
+        self.cancelled_parts: list[int] = []
+        self.running_uploads = 0
+        self.max_running_uploads = 0
+
+    async def upload_file_part(self, *, presigned_url: str, part: bytes) -> None:
+        """Keep the part under the part number from the URL"""
+        part_no = int(presigned_url.removeprefix(URL_PREFIX))
+        self.running_uploads += 1
+        self.max_running_uploads = max(self.max_running_uploads, self.running_uploads)
+        try:
+            if part_no == self.failing_part:
+                raise exceptions.BadResponseCodeError(
+                    url=presigned_url, response_code=500
+                )
+            await asyncio.sleep(self.upload_time)
+        except asyncio.CancelledError:
+            self.cancelled_parts.append(part_no)
+            raise
+        finally:
+            self.running_uploads -= 1
+        assert part_no not in self.uploaded_parts
+        self.uploaded_parts[part_no] = part
+
+
+def make_uploader(part_uploads: PartUploads) -> Mock:
+    """Create a mocked uploader that passes the part uploads to the given recorder.
+
+    The upload URL of each part contains its part number.
+    """
+    uploader = Mock(spec=UploaderBase)
+    uploader.get_part_upload_url.side_effect = lambda part_no: f"{URL_PREFIX}{part_no}"
+    uploader.upload_file_part.side_effect = part_uploads.upload_file_part
+    return uploader
+
+
+def get_requested_urls(uploader: Mock) -> list[int]:
+    """Get the numbers of the parts for which upload URLs have been requested"""
+    return sorted(
+        call.kwargs["part_no"] for call in uploader.get_part_upload_url.call_args_list
+    )
+
+
+def make_chunked_uploader(
+    *, file_path: Path, uploader: UploaderBase, max_concurrent_uploads: int = 3
+) -> ChunkedUploader:
+    """Create a ChunkedUploader encrypting the file for the test keypair"""
+    pubkey = crypt4gh.keys.get_public_key(KEY_DIR / "key.pub")
+    encryptor = Crypt4GHEncryptor(
+        part_size=PART_SIZE,
+        server_public_key=base64.b64encode(pubkey).decode("utf-8"),
+        private_key_path=KEY_DIR / "key.sec",
+    )
+    return ChunkedUploader(
+        encryptor=encryptor,
+        file_id="test-file",
+        file_path=file_path,
+        part_size=PART_SIZE,
+        max_concurrent_uploads=max_concurrent_uploads,
+        uploader=uploader,
+    )
+
+
+def decrypt_parts(parts: list[bytes], tmp_path: Path) -> bytes:
+    """Decrypt the content of the given encrypted parts"""
+    encrypted_path = tmp_path / "uploaded.c4gh"
+    decrypted_path = tmp_path / "uploaded.decrypted"
+    encrypted_path.write_bytes(b"".join(parts))
+    Crypt4GHDecryptor(decryption_key_path=KEY_DIR / "key.sec").decrypt_file(
+        input_path=encrypted_path, output_path=decrypted_path
+    )
+    return decrypted_path.read_bytes()
+
+
+async def test_upload_parts_concurrently(tmp_path: Path):
+    """Test that all parts are uploaded once, with limited concurrency"""
+    file_path = tmp_path / "test.file"
+    content = os.urandom(PART_SIZE * 17 // 2)
+    file_path.write_bytes(content)
+    part_uploads = PartUploads()
+    uploader = make_uploader(part_uploads)
+    chunked_uploader = make_chunked_uploader(file_path=file_path, uploader=uploader)
+
+    await chunked_uploader.encrypt_and_upload()
+
+    part_numbers = sorted(part_uploads.uploaded_parts)
+    assert part_numbers == list(range(1, 10))
+    assert part_uploads.max_running_uploads == 3
+    assert not part_uploads.cancelled_parts
+    parts = [part_uploads.uploaded_parts[part_no] for part_no in part_numbers]
+    assert decrypt_parts(parts, tmp_path) == content
+
+
+async def test_upload_parts_failure(tmp_path: Path):
+    """Test that running part uploads are cancelled when one of them fails"""
+    file_path = tmp_path / "test.file"
+    file_path.write_bytes(os.urandom(PART_SIZE * 17 // 2))
+    part_uploads = PartUploads(upload_time=10, failing_part=2)
+    uploader = make_uploader(part_uploads)
+    chunked_uploader = make_chunked_uploader(file_path=file_path, uploader=uploader)
+
+    with pytest.raises(exceptions.BadResponseCodeError):
+        await chunked_uploader.encrypt_and_upload()
+
+    assert sorted(part_uploads.cancelled_parts) == [1, 3]
+    assert not part_uploads.uploaded_parts
+    assert part_uploads.running_uploads == 0
+    assert asyncio.all_tasks() == {asyncio.current_task()}
+
+
+@pytest.mark.parametrize(
+    "file_size, part_count",
+    [
+        (PART_SIZE * 17 // 2, 9),
+        # the envelope pushes the end of the file into a part after the last one
+        # that is known to exist from the encrypted content size alone
+        (3_144_334, 4),
+    ],
+)
+async def test_prefetch_upload_urls(file_size: int, part_count: int, tmp_path: Path):
+    """Test that URLs are fetched once per existing part and used for that part"""
+    file_path = tmp_path / "test.file"
+    content = os.urandom(file_size)
+    file_path.write_bytes(content)
+    part_uploads = PartUploads()
+    uploader = make_uploader(part_uploads)
+    chunked_uploader = make_chunked_uploader(file_path=file_path, uploader=uploader)
+
+    await chunked_uploader.encrypt_and_upload()
+
+    part_numbers = list(range(1, part_count + 1))
+    assert get_requested_urls(uploader) == part_numbers
+    assert sorted(part_uploads.uploaded_parts) == part_numbers
+    parts = [part_uploads.uploaded_parts[part_no] for part_no in part_numbers]
+    assert decrypt_parts(parts, tmp_path) == content
+
+
+class GrowingFilePartUploads(PartUploads):
+    """Part uploads that append to the uploaded file before the first upload"""
+
+    def __init__(self, *, file_path: Path, appended_size: int):
+        super().__init__()
+        self.file_path = file_path
+        self.appended_size = appended_size
+
+    async def upload_file_part(self, *, presigned_url: str, part: bytes) -> None:
+        """Let the file grow before the first upload, then upload the part"""
+        if self.appended_size:
+            with self.file_path.open("ab") as file:
+                file.write(os.urandom(self.appended_size))
+            self.appended_size = 0
+        await super().upload_file_part(presigned_url=presigned_url, part=part)
+
+
+async def test_upload_grown_file(tmp_path: Path):
+    """Test that the upload is aborted as soon as a grown file exceeds its size"""
+    file_path = tmp_path / "test.file"
+    file_path.write_bytes(os.urandom(PART_SIZE * 17 // 2))
+    part_uploads = GrowingFilePartUploads(
+        file_path=file_path, appended_size=4 * PART_SIZE
+    )
+    uploader = make_uploader(part_uploads)
+    chunked_uploader = make_chunked_uploader(file_path=file_path, uploader=uploader)
+
+    with pytest.raises(exceptions.EncryptedSizeMismatch):
+        await chunked_uploader.encrypt_and_upload()
+
+    # the ninth part contains the end of the original file and more content
+    assert max(part_uploads.uploaded_parts) < 9
+    assert asyncio.all_tasks() == {asyncio.current_task()}